@@ -6,7 +6,7 @@
 # - Validação temporal (walk-forward) + escolha baseline vs ML
 # - Predição multi-step com recursão
 # - Predição de categorias (heurística robusta) para compor UI
-# - Serializa modelos via pickle+base64
+# - Serializa modelos via pickle comprimido (zstd/zlib) + base85 (Ridge: só parâmetros)
 #
 # Robustez (anti-500 / contrato / NoneType.predict):
 # - load seguro (_safe_load_model): não explode se b64 inválido/corrompido
@@ -19,29 +19,89 @@
 from __future__ import annotations
 
 import base64
+import copy
+import hashlib
+import heapq
+import json
+import os
 import pickle
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta
+from itertools import accumulate
 from math import sin, cos, pi, sqrt
+from operator import itemgetter
 from typing import Any, Optional, Dict, List, Tuple
 
+__all__ = [
+    "dumps_model",
+    "loads_model",
+    "RidgeModel",
+    "TrainedTarget",
+    "DailySeries",
+    "fill_daily_series",
+    "fill_daily_columns",
+    "fill_monthly_series",
+    "month_seq",
+    "build_category_profile",
+    "allocate_expense_to_categories",
+    "train_daily_sklearn",
+    "forecast_next_days_daily_v2",
+    "forecast_next_days_daily_v1_list",
+    "forecast_next_days_daily_response",
+    "forecast_next_days_daily",
+    "train_monthly_sklearn",
+    "forecast_next_months",
+]
+
 # scikit-learn / numpy (opcional)
 try:
     import numpy as np
-    from sklearn.linear_model import Ridge
-    from sklearn.pipeline import Pipeline
-    from sklearn.preprocessing import StandardScaler
+    from numpy.lib.stride_tricks import sliding_window_view
     from sklearn.ensemble import HistGradientBoostingRegressor
 except Exception as e:
     np = None
-    Ridge = None
-    Pipeline = None
-    StandardScaler = None
+    sliding_window_view = None
     HistGradientBoostingRegressor = None
     _SKLEARN_IMPORT_ERROR = e
 else:
     _SKLEARN_IMPORT_ERROR = None
 
+# zstandard (opcional): compressão dos modelos; sem ele, usa zlib (stdlib)
+try:
+    import zstandard as zstd
+except Exception:
+    zstd = None
+
+# orjson / xxhash (opcionais): chave do cache de previsões; sem eles, json + blake2b
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+try:
+    import xxhash
+except Exception:
+    xxhash = None
+
+# numba (opcional): acelera kernels numéricos; sem ele, roda em Python puro
+try:
+    from numba import njit
+except Exception:
+    njit = None
+
+# scipy (opcional): Cholesky para as equações normais do Ridge; sem ele, np.linalg.solve
+try:
+    from scipy.linalg import cho_factor, cho_solve
+except Exception:
+    cho_factor = None
+    cho_solve = None
+
 
 # -----------------------------
 # Estatística básica (fallback sem numpy)
@@ -64,44 +124,96 @@ def _py_std(xs: List[float]) -> float:
     return float(sqrt(var))
 
 
-def _mean(xs: List[float]) -> float:
-    if np is not None:
-        return float(np.mean(np.array(xs, dtype=float))) if xs else 0.0
-    return _py_mean(xs)
-
+# implementação escolhida uma vez no import (sem testar np a cada chamada);
+# aceita lista ou ndarray sem cópia extra
+if np is not None:
+    def _mean(xs: Any) -> float:
+        return float(np.mean(xs)) if len(xs) else 0.0
 
-def _std(xs: List[float]) -> float:
-    if np is not None:
-        return float(np.std(np.array(xs, dtype=float))) if len(xs) > 1 else 0.0
-    return _py_std(xs)
+    def _std(xs: Any) -> float:
+        return float(np.std(xs)) if len(xs) > 1 else 0.0
+else:
+    _mean = _py_mean
+    _std = _py_std
 
 
 # -----------------------------
 # Serialização (interna)
 # -----------------------------
+# Prefixo identifica o formato; sem prefixo => legado base64(pickle)
+_MODEL_FMT_ZSTD = "zstd85:"
+_MODEL_FMT_ZLIB = "zlib85:"
+_MODEL_FMT_RIDGE = "ridge85:"  # só parâmetros: [intercept, mean(p), scale(p), coef(p)] em float64 LE
+
+
 def dumps_model(obj: Any) -> str:
+    """
+    pickle -> comprime (zstd nível 3 ou zlib) -> base85 (texto, cabe no payload JSON).
+    RidgeModel não passa por pickle: grava só os vetores de parâmetros.
+    """
+    if isinstance(obj, RidgeModel):
+        params = np.concatenate([[obj.intercept], obj.mean, obj.scale, obj.coef]).astype("<f8")
+        return _MODEL_FMT_RIDGE + base64.b85encode(params.tobytes()).decode("ascii")
+
     raw = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
-    return base64.b64encode(raw).decode("utf-8")
+    if zstd is not None:
+        return _MODEL_FMT_ZSTD + base64.b85encode(zstd.ZstdCompressor(level=3).compress(raw)).decode("ascii")
+    return _MODEL_FMT_ZLIB + base64.b85encode(zlib.compress(raw, 6)).decode("ascii")
 
 
 def loads_model(b64: str) -> Any:
-    raw = base64.b64decode(b64.encode("utf-8"))
+    if b64.startswith(_MODEL_FMT_RIDGE):
+        params = np.frombuffer(base64.b85decode(b64[len(_MODEL_FMT_RIDGE):]), dtype="<f8").astype(np.float64)
+        p = (len(params) - 1) // 3
+        if len(params) != 3 * p + 1:
+            raise ValueError("modelo ridge corrompido")
+        return RidgeModel(mean=params[1:1 + p], scale=params[1 + p:1 + 2 * p], coef=params[1 + 2 * p:], intercept=float(params[0]))
+
+    if b64.startswith(_MODEL_FMT_ZSTD):
+        if zstd is None:
+            raise RuntimeError("zstandard não disponível para carregar o modelo")
+        raw = zstd.ZstdDecompressor().decompress(base64.b85decode(b64[len(_MODEL_FMT_ZSTD):]))
+    elif b64.startswith(_MODEL_FMT_ZLIB):
+        raw = zlib.decompress(base64.b85decode(b64[len(_MODEL_FMT_ZLIB):]))
+    else:
+        raw = base64.b64decode(b64.encode("utf-8"))
     return pickle.loads(raw)
 
 
 def _safe_load_model(b64: Optional[str]) -> Any:
     """
-    Carrega modelo serializado em base64.
+    Carrega modelo serializado (dumps_model ou legado base64).
     - Retorna None se b64 for vazio/None ou inválido/corrompido.
     """
     if not b64:
         return None
     try:
-        return loads_model(str(b64))
+        return _as_fast_model(loads_model(str(b64)))
     except Exception:
         return None
 
 
+def _as_fast_model(model: Any) -> Any:
+    """
+    Modelos antigos salvos como Pipeline(StandardScaler, Ridge) viram RidgeModel
+    (mesma conta, predict em numpy puro, sem a validação do sklearn a cada passo).
+    """
+    steps = getattr(model, "steps", None)
+    if not steps or len(steps) != 2:
+        return model
+
+    scaler, reg = steps[0][1], steps[1][1]
+    mean = getattr(scaler, "mean_", None)
+    scale = getattr(scaler, "scale_", None)
+    coef = getattr(reg, "coef_", None)
+    intercept = getattr(reg, "intercept_", None)
+    if mean is None or scale is None or coef is None or intercept is None or np.ndim(coef) != 1:
+        return model
+
+    return RidgeModel(mean=np.asarray(mean, dtype=np.float64), scale=np.asarray(scale, dtype=np.float64),
+                      coef=np.asarray(coef, dtype=np.float64), intercept=float(intercept))
+
+
 # -----------------------------
 # Utils defensivos
 # -----------------------------
@@ -114,6 +226,24 @@ def _safe_float(x: Any, default: float = 0.0) -> float:
         return float(default)
 
 
+def _float_col(values: List[Any]) -> "np.ndarray":
+    """
+    Coluna float64 a partir de valores crus das linhas.
+    Caminho rápido: np.fromiter (números já coeridos pelo SQL). O numpy converte
+    None em NaN, então posições NaN passam de novo por _safe_float; se algum valor
+    for inválido, refaz elemento a elemento.
+    """
+    try:
+        out = np.fromiter(values, dtype=np.float64, count=len(values))
+    except (TypeError, ValueError):
+        return np.array([_safe_float(v, 0.0) for v in values], dtype=np.float64)
+
+    bad = np.flatnonzero(np.isnan(out))
+    if len(bad):
+        out[bad] = [_safe_float(values[i], 0.0) for i in bad.tolist()]
+    return out
+
+
 def _parse_ymd(d: str) -> Optional[datetime]:
     try:
         return datetime.strptime(d, "%Y-%m-%d")
@@ -121,6 +251,12 @@ def _parse_ymd(d: str) -> Optional[datetime]:
         return None
 
 
+# YYYY-MM-DD canônico: ordem lexicográfica == ordem cronológica
+_YMD_RE = re.compile(r"^[0-9]{4}-[0-9]{2}-[0-9]{2}$")
+# YYYY-MM canônico e com mês válido (dispensa strptime)
+_YM_RE = re.compile(r"^[0-9]{4}-(0[1-9]|1[0-2])$")
+
+
 def _sort_unique_daily_hist(hist: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Garante:
@@ -146,11 +282,19 @@ def _sort_unique_daily_hist(hist: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
             "expense": _safe_float(r.get("expense"), 0.0),
         }
 
-    def _key(dd: str):
+    def _key(dd: str) -> Tuple[int, str]:
+        if _YMD_RE.match(dd):
+            return (0, dd)
         dt = _parse_ymd(dd)
-        return dt if dt is not None else dd  # type: ignore[return-value]
+        return (0, dt.strftime("%Y-%m-%d")) if dt is not None else (1, dd)
 
-    out = [tmp[d] for d in sorted(tmp.keys(), key=_key)]
+    # caso comum (todas canônicas): sort direto em C, sem callback nem strptime
+    if all(_YMD_RE.match(d) for d in tmp):
+        keys = sorted(tmp)
+    else:
+        keys = sorted(tmp, key=_key)
+
+    out = [tmp[d] for d in keys]
     for r in out:
         r["net"] = float(_safe_float(r.get("income")) - _safe_float(r.get("expense")))
     return out
@@ -159,39 +303,126 @@ def _sort_unique_daily_hist(hist: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
 # -----------------------------
 # Features
 # -----------------------------
+# sin/cos sazonais só veem 7 (dia da semana) e 12 (mês) valores: tabelas fixas.
+# Índice = dow (0..6) e moy (1..12; posição 0 = ângulo 0, nunca usada por mês válido).
+_SIN7 = [sin(2.0 * pi * (float(k) / 7.0)) for k in range(7)]
+_COS7 = [cos(2.0 * pi * (float(k) / 7.0)) for k in range(7)]
+_SIN12 = [sin(2.0 * pi * (float(k) / 12.0)) for k in range(13)]
+_COS12 = [cos(2.0 * pi * (float(k) / 12.0)) for k in range(13)]
+
+
+_N_DATE_FEATS = 8  # colunas de _date_feats_dt
+_N_YM_FEATS = 4    # colunas de _ym_feats
+
+
 def _date_feats(date_str: str, t_idx: int) -> List[float]:
-    dt = datetime.strptime(date_str, "%Y-%m-%d")
+    return _date_feats_dt(datetime.strptime(date_str, "%Y-%m-%d"), t_idx)
+
+
+def _date_feats_dt(dt: datetime, t_idx: int) -> List[float]:
     dow = dt.weekday()  # 0..6
     dom = dt.day        # 1..31
     moy = dt.month      # 1..12
 
-    ang7 = 2.0 * pi * (float(dow) / 7.0)
-    ang12 = 2.0 * pi * (float(moy) / 12.0)
-
     return [
         float(t_idx),
         float(dow),
-        sin(ang7),
-        cos(ang7),
+        _SIN7[dow],
+        _COS7[dow],
         float(dom),
         float(moy),
-        sin(ang12),
-        cos(ang12),
+        _SIN12[moy],
+        _COS12[moy],
     ]
 
 
 def _ym_feats(ym: str, t_idx: int) -> List[float]:
     _, m = ym.split("-")
     month = int(m)
-    ang12 = 2.0 * pi * (float(month) / 12.0)
-    return [float(t_idx), float(month), sin(ang12), cos(ang12)]
+    return [float(t_idx), float(month), _SIN12[month], _COS12[month]]
 
 
-def _rolling_mean(vals: List[float], w: int) -> float:
-    if not vals:
+def _parse_dates_vec(dates: List[str]) -> "np.ndarray":
+    """
+    YYYY-MM-DD -> datetime64[D], parseado em C (uma vez por série, sem strptime).
+    """
+    return np.array(dates, dtype="datetime64[D]")
+
+
+def _dow_vec(d: "np.ndarray") -> "np.ndarray":
+    """
+    weekday() vetorizado (0=segunda); 1970-01-01 foi quinta (weekday 3).
+    """
+    return (d.astype("datetime64[D]").astype(np.int64) + 3) % 7
+
+
+def _date_feats_vec(dates: List[str], t_idx: "np.ndarray") -> "np.ndarray":
+    """
+    Versão vetorizada de _date_feats (mesmas colunas, uma linha por data).
+    """
+    d = _parse_dates_vec(dates)
+    m = d.astype("datetime64[M]")
+    dow = _dow_vec(d)
+    dom = (d - m.astype("datetime64[D]")).astype(np.int64) + 1
+    moy = m.astype(np.int64) % 12 + 1
+
+    sin7, cos7 = np.array(_SIN7), np.array(_COS7)
+    sin12, cos12 = np.array(_SIN12), np.array(_COS12)
+
+    return np.column_stack([
+        t_idx, dow, sin7[dow], cos7[dow],
+        dom, moy, sin12[moy], cos12[moy],
+    ]).astype(float)
+
+
+def _ym_feats_vec(yms: List[str], t_idx: "np.ndarray") -> "np.ndarray":
+    """
+    Versão vetorizada de _ym_feats.
+    """
+    month = np.array(yms, dtype="datetime64[M]").astype(np.int64) % 12 + 1
+    return np.column_stack([t_idx, month, np.array(_SIN12)[month], np.array(_COS12)[month]]).astype(float)
+
+
+def _prefix_sums(vals: List[float]) -> List[float]:
+    """
+    Soma acumulada com 0.0 na frente: csum[i] = sum(vals[:i]).
+    """
+    return list(accumulate((float(v) for v in vals), initial=0.0))
+
+
+def _prefix_mean(csum: List[float], w: int) -> float:
+    """
+    Média dos últimos w valores (janela truncada no início) a partir de
+    csum = _prefix_sums(vals), em O(1). Série vazia => 0.0.
+    """
+    n = len(csum) - 1
+    if n <= 0:
         return 0.0
-    w = max(1, min(int(w), len(vals)))
-    return float(sum(vals[-w:]) / float(w))
+    w = max(1, min(int(w), n))
+    return float((csum[n] - csum[n - w]) / float(w))
+
+
+def _trailing_means(arr: "np.ndarray", idx: "np.ndarray", w: int) -> "np.ndarray":
+    """
+    Para cada i em idx: média de arr[i-w:i] (janela truncada no início),
+    mesma regra de _prefix_mean. Usa soma acumulada (O(1) por linha).
+    """
+    csum = np.concatenate(([0.0], np.cumsum(arr)))
+    ww = np.minimum(idx, int(w))
+    return (csum[idx] - csum[idx - ww]) / ww
+
+
+# Features ficam em float64 de propósito:
+# - HistGradientBoostingRegressor converte X para float64 (X_DTYPE) em todo fit;
+#   float32 só acrescentaria uma cópia por passo do walk-forward
+# - o walk-forward do Ridge resolve as equações normais em float64
+# - StandardScaler(copy=False) escalaria o X do chamador in-place, e o mesmo X
+#   é reutilizado (resíduos do modelo final e o segundo alvo)
+def _lag_block(arr: "np.ndarray", lags: int) -> "np.ndarray":
+    """
+    Linha j contém arr[i-1], arr[i-2], ..., arr[i-lags] para i = lags + j.
+    """
+    return sliding_window_view(arr[:-1], lags)[:, ::-1]
 
 
 def _make_supervised_daily(
@@ -203,28 +434,28 @@ def _make_supervised_daily(
     if np is None:
         raise RuntimeError("numpy não disponível para _make_supervised_daily")
 
-    X, y_inc, y_exp = [], [], []
-
-    for i in range(lags, len(dates)):
-        inc_lags = [inc[i - k] for k in range(1, lags + 1)]
-        exp_lags = [exp[i - k] for k in range(1, lags + 1)]
+    n = len(dates)
+    if n <= lags:
+        return np.array([], dtype=float), np.array([], dtype=float), np.array([], dtype=float)
 
-        feats = _date_feats(dates[i], i)
+    inc_arr = np.asarray(inc, dtype=np.float64)
+    exp_arr = np.asarray(exp, dtype=np.float64)
+    net_arr = inc_arr - exp_arr
+    idx = np.arange(lags, n)
 
-        inc_ma7 = _rolling_mean(inc[:i], 7)
-        inc_ma14 = _rolling_mean(inc[:i], 14)
-        exp_ma7 = _rolling_mean(exp[:i], 7)
-        exp_ma14 = _rolling_mean(exp[:i], 14)
+    X = np.column_stack([
+        _date_feats_vec(dates[lags:], idx),
+        _lag_block(inc_arr, lags),
+        _lag_block(exp_arr, lags),
+        _trailing_means(inc_arr, idx, 7),
+        _trailing_means(inc_arr, idx, 14),
+        _trailing_means(exp_arr, idx, 7),
+        _trailing_means(exp_arr, idx, 14),
+        net_arr[idx - 1],
+        _trailing_means(net_arr, idx, 7),
+    ])
 
-        net_last = float(inc[i - 1] - exp[i - 1])
-        net_ma7 = float(_rolling_mean([a - b for a, b in zip(inc[:i], exp[:i])], 7))
-
-        row = feats + inc_lags + exp_lags + [inc_ma7, inc_ma14, exp_ma7, exp_ma14, net_last, net_ma7]
-        X.append([float(v) for v in row])
-        y_inc.append(float(inc[i]))
-        y_exp.append(float(exp[i]))
-
-    return np.array(X, dtype=float), np.array(y_inc, dtype=float), np.array(y_exp, dtype=float)
+    return np.ascontiguousarray(X, dtype=float), inc_arr[lags:].copy(), exp_arr[lags:].copy()
 
 
 def _make_supervised_monthly(
@@ -236,28 +467,28 @@ def _make_supervised_monthly(
     if np is None:
         raise RuntimeError("numpy não disponível para _make_supervised_monthly")
 
-    X, y_inc, y_exp = [], [], []
-
-    for i in range(lags, len(yms)):
-        inc_lags = [inc[i - k] for k in range(1, lags + 1)]
-        exp_lags = [exp[i - k] for k in range(1, lags + 1)]
+    n = len(yms)
+    if n <= lags:
+        return np.array([], dtype=float), np.array([], dtype=float), np.array([], dtype=float)
 
-        feats = _ym_feats(yms[i], i)
+    inc_arr = np.asarray(inc, dtype=np.float64)
+    exp_arr = np.asarray(exp, dtype=np.float64)
+    net_arr = inc_arr - exp_arr
+    idx = np.arange(lags, n)
 
-        inc_ma3 = _rolling_mean(inc[:i], 3)
-        inc_ma6 = _rolling_mean(inc[:i], 6)
-        exp_ma3 = _rolling_mean(exp[:i], 3)
-        exp_ma6 = _rolling_mean(exp[:i], 6)
+    X = np.column_stack([
+        _ym_feats_vec(yms[lags:], idx),
+        _lag_block(inc_arr, lags),
+        _lag_block(exp_arr, lags),
+        _trailing_means(inc_arr, idx, 3),
+        _trailing_means(inc_arr, idx, 6),
+        _trailing_means(exp_arr, idx, 3),
+        _trailing_means(exp_arr, idx, 6),
+        net_arr[idx - 1],
+        _trailing_means(net_arr, idx, 3),
+    ])
 
-        net_last = float(inc[i - 1] - exp[i - 1])
-        net_ma3 = float(_rolling_mean([a - b for a, b in zip(inc[:i], exp[:i])], 3))
-
-        row = feats + inc_lags + exp_lags + [inc_ma3, inc_ma6, exp_ma3, exp_ma6, net_last, net_ma3]
-        X.append([float(v) for v in row])
-        y_inc.append(float(inc[i]))
-        y_exp.append(float(exp[i]))
-
-    return np.array(X, dtype=float), np.array(y_inc, dtype=float), np.array(y_exp, dtype=float)
+    return np.ascontiguousarray(X, dtype=float), inc_arr[lags:].copy(), exp_arr[lags:].copy()
 
 
 # -----------------------------
@@ -267,27 +498,32 @@ def _mae(y_true: "np.ndarray", y_pred: "np.ndarray") -> float:
     return float(np.mean(np.abs(y_true - y_pred)))
 
 
+def _walk_forward_bounds(n: int, n_start: int, n_steps: int) -> Tuple[int, int]:
+    n_start = max(5, min(int(n_start), n - 2))
+    end = min(n, n_start + max(1, int(n_steps)))
+    return n_start, end
+
+
 def _walk_forward_mae(
     X: "np.ndarray",
     y: "np.ndarray",
     fit_predict_fn,
     n_start: int,
     n_steps: int,
+    stride: int = 1,
 ) -> float:
     """
     Walk-forward 1-step:
     - Treina em [0:t)
     - Prediz em t
-    - Avança
+    - Avança (de stride em stride; stride > 1 avalia um subconjunto dos passos)
     """
-    n = len(y)
-    n_start = max(5, min(int(n_start), n - 2))
-    end = min(n, n_start + max(1, int(n_steps)))
+    n_start, end = _walk_forward_bounds(len(y), n_start, n_steps)
 
     preds = []
     trues = []
 
-    for t in range(n_start, end):
+    for t in range(n_start, end, max(1, int(stride))):
         Xtr, ytr = X[:t], y[:t]
         Xte, yte = X[t:t + 1], y[t:t + 1]
         yp = float(fit_predict_fn(Xtr, ytr, Xte)[0])
@@ -297,44 +533,256 @@ def _walk_forward_mae(
     return _mae(np.array(trues, dtype=float), np.array(preds, dtype=float))
 
 
+def _solve_spd(a: "np.ndarray", b: "np.ndarray") -> "np.ndarray":
+    """
+    Resolve a·x = b com `a` simétrica positiva definida (XᵀX + αI, α > 0).
+    Cholesky (scipy) quando disponível; senão solve geral do numpy.
+    `a` pode ser sobrescrita.
+    """
+    if cho_factor is not None:
+        return cho_solve(cho_factor(a, lower=True, overwrite_a=True, check_finite=False), b, check_finite=False)
+    return np.linalg.solve(a, b)
+
+
+def _scaler_sd(var: "np.ndarray", mu: "np.ndarray") -> "np.ndarray":
+    """Desvio populacional como no StandardScaler (feature constante => 1)."""
+    sd = np.sqrt(np.maximum(var, 0.0))
+    sd[sd <= 1e-12 * np.maximum(1.0, np.abs(mu))] = 1.0
+    return sd
+
+
+@dataclass
+class RidgeModel:
+    """
+    Equivalente a Pipeline(StandardScaler, Ridge(alpha)) já treinado:
+    predict(X) = intercept + ((X - mean) / scale) @ coef
+    """
+    mean: Any
+    scale: Any
+    coef: Any
+    intercept: float
+
+    def predict(self, X: Any) -> "np.ndarray":
+        X = np.asarray(X, dtype=np.float64)
+        return self.intercept + ((X - self.mean) / self.scale) @ self.coef
+
+
+def _stack_linear(inc_model: Any, exp_model: Any) -> Optional[Tuple["np.ndarray", "np.ndarray"]]:
+    """
+    Os dois alvos em RidgeModel: dobra a padronização nos coeficientes e empilha
+    -> (W (n_feat, 2), b (2,)), e cada passo vira um único x @ W + b.
+    """
+    if not (isinstance(inc_model, RidgeModel) and isinstance(exp_model, RidgeModel)):
+        return None
+    if len(inc_model.coef) != len(exp_model.coef):
+        return None
+
+    w_inc = inc_model.coef / inc_model.scale
+    w_exp = exp_model.coef / exp_model.scale
+    W = np.column_stack([w_inc, w_exp])
+    b = np.array([
+        inc_model.intercept - float(inc_model.mean @ w_inc),
+        exp_model.intercept - float(exp_model.mean @ w_exp),
+    ])
+    return W, b
+
+
+def _fit_ridge(X: "np.ndarray", y: "np.ndarray", alpha: float) -> RidgeModel:
+    """
+    Ridge com intercepto sobre colunas padronizadas, direto nas equações normais:
+    (ZᵀZ + αI)·β = Zᵀ(y - ȳ), Z = (X - μ) / σ. Mesmo resultado do Pipeline, sem o overhead dele.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    mu = X.mean(axis=0)
+    y_mean = float(y.mean())
+    Z = X - mu
+    sd = _scaler_sd(np.einsum("ij,ij->j", Z, Z) / len(y), mu)
+    Z /= sd
+
+    G = Z.T @ Z
+    G.flat[:: G.shape[0] + 1] += alpha
+    beta = _solve_spd(G, Z.T @ (y - y_mean))
+
+    return RidgeModel(mean=mu, scale=sd, coef=beta, intercept=y_mean)
+
+
+def _ridge_walk_forward_mae(
+    X: "np.ndarray",
+    y: "np.ndarray",
+    alpha: float,
+    n_start: int,
+    n_steps: int,
+    stride: int = 1,
+) -> float:
+    """
+    Mesmo walk-forward de Pipeline(StandardScaler, Ridge(alpha)) re-treinado a cada passo,
+    sem refit: mantém somas (Σx, XᵀX, Xᵀy, Σy) atualizadas com 1 linha por passo e
+    resolve as equações normais (já padronizadas e centradas) com um solve p×p.
+    Com stride > 1 só prediz nos mesmos passos de _walk_forward_mae (as somas
+    continuam avançando linha a linha).
+    """
+    n_start, end = _walk_forward_bounds(len(y), n_start, n_steps)
+
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    eye = np.eye(X.shape[1])
+
+    Xtr, ytr = X[:n_start], y[:n_start]
+    s_x = Xtr.sum(axis=0)
+    xtx = Xtr.T @ Xtr
+    xty = Xtr.T @ ytr
+    s_y = float(ytr.sum())
+
+    preds = []
+    trues = []
+
+    stride = max(1, int(stride))
+    for t in range(n_start, end):
+        x_t = X[t]
+        if (t - n_start) % stride == 0:
+            m = float(t)
+            mu = s_x / m
+            y_mean = s_y / m
+
+            cxx = xtx - m * np.outer(mu, mu)
+            cxy = xty - m * mu * y_mean
+
+            sd = _scaler_sd(np.diag(cxx) / m, mu)
+
+            beta = _solve_spd(cxx / np.outer(sd, sd) + alpha * eye, cxy / sd)
+
+            preds.append(y_mean + float(((x_t - mu) / sd) @ beta))
+            trues.append(float(y[t]))
+
+        s_x += x_t
+        xtx += np.outer(x_t, x_t)
+        xty += x_t * y[t]
+        s_y += float(y[t])
+
+    return _mae(np.array(trues, dtype=float), np.array(preds, dtype=float))
+
+
 # -----------------------------
 # Baseline sazonal (forte e barato)
 # -----------------------------
+_SEASONAL_LOOKBACK = 56
+
+
+def _baseline_seasonal_kernel(dow, vals, target_dow: int, w: int, alpha: float) -> float:
+    """
+    Núcleo numérico do baseline sazonal (compilado com numba quando disponível).
+
+    dow -> dia da semana alinhado ao FINAL de vals (-1 = data inválida)
+    """
+    n = len(vals)
+    if n == 0:
+        return 0.0
+
+    w = max(1, min(w, n))
+    s_ma = 0.0
+    for i in range(n - w, n):
+        s_ma += vals[i]
+    ma = s_ma / w
+
+    m = min(len(dow), n)
+    lookback = min(m, _SEASONAL_LOOKBACK)
+    s = 0.0
+    c = 0
+    for j in range(m - lookback, m):
+        if dow[j] == target_dow:
+            s += vals[n - m + j]
+            c += 1
+
+    if c == 0:
+        return ma
+    return alpha * (s / c) + (1.0 - alpha) * ma
+
+
+if njit is not None:
+    _baseline_seasonal_kernel = njit(cache=True)(_baseline_seasonal_kernel)
+
+
+def _baseline_rollout_kernel(dows, inc, exp, n_hist: int, w: int, alpha: float) -> None:
+    """
+    Roll-out recursivo do baseline sazonal para income e expense de uma vez:
+    preenche inc[n_hist:] e exp[n_hist:] (in-place), cada passo usando os anteriores.
+    """
+    for t in range(n_hist, len(inc)):
+        ip = _baseline_seasonal_kernel(dows[:t], inc[:t], dows[t], w, alpha)
+        ep = _baseline_seasonal_kernel(dows[:t], exp[:t], dows[t], w, alpha)
+        inc[t] = max(0.0, ip)
+        exp[t] = max(0.0, ep)
+
+
+if njit is not None:
+    _baseline_rollout_kernel = njit(cache=True)(_baseline_rollout_kernel)
+
+
+def _baseline_rollout(
+    dows: List[int],
+    inc_vals: List[float],
+    exp_vals: List[float],
+    last_dow: int,
+    days: int,
+) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Previsões (income, expense) dos próximos `days` dias quando os 2 alvos usam baseline.
+    """
+    n = len(inc_vals)
+    dow_arr = np.empty(n + days, dtype=np.int8)
+    dow_arr[:n] = dows
+    dow_arr[n:] = (int(last_dow) + 1 + np.arange(days)) % 7
+
+    inc = np.zeros(n + days, dtype=np.float64)
+    exp = np.zeros(n + days, dtype=np.float64)
+    inc[:n] = inc_vals
+    exp[:n] = exp_vals
+
+    _baseline_rollout_kernel(dow_arr, inc, exp, n, 7, 0.6)
+    return inc[n:], exp[n:]
+
+
+def _weekday(d: str) -> int:
+    dt = _parse_ymd(d)
+    return dt.weekday() if dt is not None else -1
+
+
 def _baseline_seasonal_predict_one(
     history_dates: List[str],
     history_vals: List[float],
     target_date: str,
     fallback_w: int = 7,
     alpha: float = 0.6,
+    history_dows: Optional[List[int]] = None,
+    target_dow: Optional[int] = None,
 ) -> float:
     """
     Prediz usando média do mesmo dia da semana nas últimas semanas,
     com suavização para a média móvel recente.
 
     alpha -> peso do sazonal; (1-alpha) -> peso da média móvel
+    history_dows/target_dow -> dias da semana já calculados (evita reparsear as datas)
     """
     if not history_vals:
         return 0.0
 
-    ma = _rolling_mean(history_vals, fallback_w)
-
-    dt_target = datetime.strptime(target_date, "%Y-%m-%d")
-    dow_target = dt_target.weekday()
+    if target_dow is None:
+        target_dow = datetime.strptime(target_date, "%Y-%m-%d").weekday()
 
-    lookback = min(len(history_dates), 56)
-    vals_same_dow = []
-    for d, v in zip(history_dates[-lookback:], history_vals[-lookback:]):
-        try:
-            if datetime.strptime(d, "%Y-%m-%d").weekday() == dow_target:
-                vals_same_dow.append(float(v))
-        except Exception:
-            continue
+    tail = max(_SEASONAL_LOOKBACK, int(fallback_w))
+    if history_dows is not None:
+        dows = list(history_dows[-_SEASONAL_LOOKBACK:])
+    else:
+        dows = [_weekday(d) for d in history_dates[-_SEASONAL_LOOKBACK:]]
+    vals = [float(v) for v in history_vals[-tail:]]
 
-    if not vals_same_dow:
-        return float(ma)
+    if np is not None:
+        dows = np.asarray(dows, dtype=np.int8)
+        vals = np.asarray(vals, dtype=np.float64)
 
-    seasonal = float(sum(vals_same_dow) / float(len(vals_same_dow)))
-    return float(alpha * seasonal + (1.0 - alpha) * ma)
+    return float(_baseline_seasonal_kernel(dows, vals, int(target_dow), int(fallback_w), float(alpha)))
 
 
 # -----------------------------
@@ -349,6 +797,52 @@ class TrainedTarget:
     resid_std: float
 
 
+# Mesma configuração na validação e no modelo final: o MAE que decide baseline/ridge/hgb
+# (e vai para mae_val) precisa ser o do modelo que é salvo. 150 iterações mantém o
+# walk-forward (um fit por passo) barato.
+_HGB_MAX_ITER = 150
+
+
+def _make_hgb(max_iter: int) -> Any:
+    return HistGradientBoostingRegressor(
+        loss="squared_error",
+        max_depth=3,
+        learning_rate=0.06,
+        max_iter=int(max_iter),
+        random_state=42,
+    )
+
+
+# Cache de MAE de validação: mesmo (X, y, janela) => mesmo MAE (modelos determinísticos).
+# Evita refazer o walk-forward quando o treino é disparado de novo sem histórico novo.
+_WF_CACHE_MAX = 256
+_WF_CACHE: "OrderedDict[Tuple[str, int, int, int, str], float]" = OrderedDict()
+_WF_CACHE_LOCK = threading.Lock()  # income/expense podem treinar em threads paralelas
+
+
+def _wf_digest(X: "np.ndarray", y: "np.ndarray") -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr(X.shape).encode())
+    h.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(y, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def _wf_cached(key: Tuple[str, int, int, int, str], compute) -> float:
+    with _WF_CACHE_LOCK:
+        hit = _WF_CACHE.get(key)
+        if hit is not None:
+            _WF_CACHE.move_to_end(key)
+            return hit
+
+    val = float(compute())
+    with _WF_CACHE_LOCK:
+        _WF_CACHE[key] = val
+        while len(_WF_CACHE) > _WF_CACHE_MAX:
+            _WF_CACHE.popitem(last=False)
+    return val
+
+
 def _fit_one_target(
     X: "np.ndarray",
     y: "np.ndarray",
@@ -364,7 +858,7 @@ def _fit_one_target(
     Validação: walk-forward em janela final (~20%).
     """
     # Se algo essencial do ML não existir, cai em baseline sem drama
-    if np is None or Pipeline is None or StandardScaler is None or Ridge is None or HistGradientBoostingRegressor is None:
+    if np is None or HistGradientBoostingRegressor is None:
         ys = [float(v) for v in (y.tolist() if hasattr(y, "tolist") else list(y))]
         s = _std(ys)
         return TrainedTarget(
@@ -390,6 +884,9 @@ def _fit_one_target(
     n_val = max(10, int(0.2 * n))
     n_start = n - n_val
     n_steps = n_val
+    # HGB é caro: avalia no máximo ~20 passos espaçados da janela de validação. Os três
+    # candidatos usam os MESMOS passos, senão os MAEs comparados vêm de amostras diferentes
+    stride = max(1, n_steps // 20)
 
     # ---- baseline walk-forward
     if dates_for_baseline is None:
@@ -397,8 +894,12 @@ def _fit_one_target(
             last = float(ytr[-1])
             return np.array([last], dtype=float)
 
-        base_mae = _walk_forward_mae(X, y, baseline_fit_predict, n_start=n_start, n_steps=n_steps)
+        base_mae = _walk_forward_mae(X, y, baseline_fit_predict, n_start=n_start, n_steps=n_steps, stride=stride)
     else:
+        # dia da semana calculado uma única vez (antes: strptime a cada passo)
+        dow_arr = _dow_vec(_parse_dates_vec(dates_for_baseline)).astype(np.int8)
+        y_arr = np.ascontiguousarray(y, dtype=np.float64)
+
         def baseline_fit_predict(_Xtr, ytr, _Xte):
             t = len(ytr)
             if t < 1:
@@ -406,40 +907,29 @@ def _fit_one_target(
             if t >= len(dates_for_baseline):
                 return np.array([float(ytr[-1])], dtype=float)
 
-            target_date = dates_for_baseline[t]
-            pred = _baseline_seasonal_predict_one(
-                history_dates=dates_for_baseline[:t],
-                history_vals=[float(v) for v in y[:t]],
-                target_date=target_date,
-            )
+            pred = _baseline_seasonal_kernel(dow_arr[:t], y_arr[:t], int(dow_arr[t]), 7, 0.6)
             return np.array([pred], dtype=float)
 
-        base_mae = _walk_forward_mae(X, y, baseline_fit_predict, n_start=n_start, n_steps=n_steps)
-
-    # ---- Ridge
-    def ridge_fit_predict(Xtr, ytr, Xte):
-        model = Pipeline([
-            ("scaler", StandardScaler(with_mean=True, with_std=True)),
-            ("model", Ridge(alpha=3.0)),
-        ])
-        model.fit(Xtr, ytr)
-        return model.predict(Xte)
+        base_mae = _walk_forward_mae(X, y, baseline_fit_predict, n_start=n_start, n_steps=n_steps, stride=stride)
 
-    ridge_mae = _walk_forward_mae(X, y, ridge_fit_predict, n_start=n_start, n_steps=n_steps)
+    # ---- Ridge (walk-forward incremental, sem refit por passo)
+    digest = _wf_digest(X, y)
+    ridge_mae = _wf_cached(
+        ("ridge", n_start, n_steps, stride, digest),
+        lambda: _ridge_walk_forward_mae(X, y, alpha=3.0, n_start=n_start, n_steps=n_steps, stride=stride),
+    )
 
     # ---- HGB
+    # um estimador só: fit() sem warm_start descarta o estado do passo anterior
+    hgb_wf = _make_hgb(_HGB_MAX_ITER)
+
     def hgb_fit_predict(Xtr, ytr, Xte):
-        model = HistGradientBoostingRegressor(
-            loss="squared_error",
-            max_depth=3,
-            learning_rate=0.06,
-            max_iter=450,
-            random_state=42,
-        )
-        model.fit(Xtr, ytr)
-        return model.predict(Xte)
+        return hgb_wf.fit(Xtr, ytr).predict(Xte)
 
-    hgb_mae = _walk_forward_mae(X, y, hgb_fit_predict, n_start=n_start, n_steps=n_steps)
+    hgb_mae = _wf_cached(
+        ("hgb", n_start, n_steps, stride, digest),
+        lambda: _walk_forward_mae(X, y, hgb_fit_predict, n_start=n_start, n_steps=n_steps, stride=stride),
+    )
 
     best_algo = "baseline_seasonal"
     best_mae = float(base_mae)
@@ -461,24 +951,14 @@ def _fit_one_target(
 
     # Treina modelo final em TODO histórico (se ML escolhido)
     if best_algo == "ridge":
-        final_model = Pipeline([
-            ("scaler", StandardScaler(with_mean=True, with_std=True)),
-            ("model", Ridge(alpha=3.0)),
-        ])
-        final_model.fit(X, y)
+        final_model = _fit_ridge(X, y, alpha=3.0)
         best_model = final_model
 
         resid = final_model.predict(X) - y
         resid_std = float(np.std(resid)) if len(resid) > 1 else 0.0
 
     elif best_algo == "hgb":
-        final_model = HistGradientBoostingRegressor(
-            loss="squared_error",
-            max_depth=3,
-            learning_rate=0.06,
-            max_iter=450,
-            random_state=42,
-        )
+        final_model = _make_hgb(_HGB_MAX_ITER)
         final_model.fit(X, y)
         best_model = final_model
 
@@ -498,19 +978,113 @@ def _fit_one_target(
     )
 
 
+# Treinar income/expense em paralelo só compensa com mais de 1 núcleo
+# (numpy/sklearn liberam o GIL nos kernels C).
+_PARALLEL_TARGETS = (os.cpu_count() or 1) > 1
+
+
+# Pool único e preguiçoso: as threads ficam vivas entre treinos em vez de serem
+# criadas e destruídas a cada /train.
+_TARGETS_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_TARGETS_EXECUTOR_LOCK = threading.Lock()
+
+
+def _targets_executor() -> ThreadPoolExecutor:
+    global _TARGETS_EXECUTOR
+    if _TARGETS_EXECUTOR is None:
+        with _TARGETS_EXECUTOR_LOCK:
+            if _TARGETS_EXECUTOR is None:
+                _TARGETS_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="fit-target")
+    return _TARGETS_EXECUTOR
+
+
+def _fit_targets(
+    X: "np.ndarray",
+    y_inc: "np.ndarray",
+    y_exp: "np.ndarray",
+    dates_for_baseline: Optional[List[str]],
+    force_ml: bool,
+) -> Tuple[TrainedTarget, TrainedTarget]:
+    """
+    Os dois alvos são independentes: com mais de 1 núcleo, treina em 2 threads.
+    """
+    if not _PARALLEL_TARGETS:
+        return (
+            _fit_one_target(X, y_inc, dates_for_baseline=dates_for_baseline, force_ml=force_ml),
+            _fit_one_target(X, y_exp, dates_for_baseline=dates_for_baseline, force_ml=force_ml),
+        )
+
+    ex = _targets_executor()
+    f_inc = ex.submit(_fit_one_target, X, y_inc, dates_for_baseline, force_ml)
+    f_exp = ex.submit(_fit_one_target, X, y_exp, dates_for_baseline, force_ml)
+    return f_inc.result(), f_exp.result()
+
+
 # -----------------------------
 # Preencher datas faltantes
 # -----------------------------
-def fill_daily_series(rows: List[Dict[str, Any]]) -> Tuple[List[str], List[float], List[float]]:
+@dataclass
+class DailySeries:
+    """
+    Série diária contínua em colunas (SoA).
+    - dates: datetime64[D]; income/expense: float64
+    - sem numpy: listas (dates como strings YYYY-MM-DD)
+    Dicts por linha só na borda JSON (tail_records).
+    """
+    dates: Any
+    income: Any
+    expense: Any
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def date_strs(self) -> List[str]:
+        return _as_list(self.dates.astype(str) if hasattr(self.dates, "astype") else self.dates)
+
+    def tail_records(self, n: int) -> List[Dict[str, Any]]:
+        """
+        Últimas n linhas no formato de history_tail.
+        """
+        ds = DailySeries(self.dates[-n:], (), ()).date_strs()
+        inc, exp, net = _float_cols(self.income[-n:], self.expense[-n:])
+        return [{"date": d, "income": i, "expense": e, "net": v} for d, i, e, v in zip(ds, inc, exp, net)]
+
+
+def _float_cols(inc: Any, exp: Any) -> Tuple[List[float], List[float], List[float]]:
+    """
+    (income, expense, net) como listas de float Python: com numpy, subtração e
+    conversão em bloco (tolist) em vez de float() por elemento.
+    """
+    if np is not None:
+        inc_a = np.asarray(inc, dtype=np.float64)
+        exp_a = np.asarray(exp, dtype=np.float64)
+        return inc_a.tolist(), exp_a.tolist(), (inc_a - exp_a).tolist()
+    inc_l = [float(i) for i in inc]
+    exp_l = [float(e) for e in exp]
+    return inc_l, exp_l, [i - e for i, e in zip(inc_l, exp_l)]
+
+
+def _monthly_history(yms: List[str], inc: Any, exp: Any) -> List[Dict[str, Any]]:
+    inc_l, exp_l, bal = _float_cols(inc, exp)
+    return [{"ym": ym, "income": i, "expense_total": e, "balance": b} for ym, i, e, b in zip(yms, inc_l, exp_l, bal)]
+
+
+def _as_list(x: Any) -> list:
+    return x.tolist() if hasattr(x, "tolist") else list(x)
+
+
+def _fill_daily(rows: List[Dict[str, Any]]) -> DailySeries:
     """
     rows: [{date:'YYYY-MM-DD', income:float, expense:float}] (dias com movimento)
     devolve série diária contínua (dias sem movimento => 0)
     """
+    empty = DailySeries([], [], [])
     if not rows:
-        return [], [], []
+        return empty
 
     # normaliza e mantém 1 por dia (último vence)
     by_d: Dict[str, Dict[str, Any]] = {}
+    parsed: Dict[str, datetime] = {}
     for r in rows:
         if not isinstance(r, dict):
             continue
@@ -518,12 +1092,26 @@ def fill_daily_series(rows: List[Dict[str, Any]]) -> Tuple[List[str], List[float
         if not d:
             continue
         # opcional: valida formato
-        if _parse_ymd(d) is None:
+        dt = _parse_ymd(d)
+        if dt is None:
             continue
         by_d[d] = r
+        parsed[d] = dt
 
     if not by_d:
-        return [], [], []
+        return empty
+
+    if np is not None:
+        # reindex denso: uma alocação por série em vez de 1 lookup/strftime por dia
+        keys = np.array([parsed[d] for d in by_d], dtype="datetime64[D]")
+        full = np.arange(keys.min(), keys.max() + 1, dtype="datetime64[D]")
+        pos = (keys - full[0]).astype(np.int64)
+
+        inc_arr = np.zeros(len(full), dtype=np.float64)
+        exp_arr = np.zeros(len(full), dtype=np.float64)
+        inc_arr[pos] = _float_col([r.get("income") for r in by_d.values()])
+        exp_arr[pos] = _float_col([r.get("expense") for r in by_d.values()])
+        return DailySeries(full, inc_arr, exp_arr)
 
     d0 = datetime.strptime(min(by_d.keys()), "%Y-%m-%d")
     d1 = datetime.strptime(max(by_d.keys()), "%Y-%m-%d")
@@ -538,7 +1126,41 @@ def fill_daily_series(rows: List[Dict[str, Any]]) -> Tuple[List[str], List[float
         exp.append(_safe_float(r.get("expense"), 0.0))
         cur += timedelta(days=1)
 
-    return dates, inc, exp
+    return DailySeries(dates, inc, exp)
+
+
+def fill_daily_columns(dates: List[str], income: Any, expense: Any) -> DailySeries:
+    """
+    Colunas vindas direto do SQL (GROUP BY date: datas únicas e em ordem) -> série contínua.
+    Com numpy, as datas ISO são convertidas em bloco (datetime64) sem dict nem strptime por
+    linha; datas inválidas (ou sem numpy) caem no caminho por linhas de _fill_daily.
+    """
+    if not len(dates):
+        return DailySeries([], [], [])
+    if np is not None:
+        try:
+            keys = np.array(dates, dtype="datetime64[D]")
+        except ValueError:
+            keys = None
+        if keys is not None:
+            full = np.arange(keys.min(), keys.max() + 1, dtype="datetime64[D]")
+            pos = (keys - full[0]).astype(np.int64)
+
+            inc_arr = np.zeros(len(full), dtype=np.float64)
+            exp_arr = np.zeros(len(full), dtype=np.float64)
+            inc_arr[pos] = _float_col(income)
+            exp_arr[pos] = _float_col(expense)
+            return DailySeries(full, inc_arr, exp_arr)
+
+    return _fill_daily([{"date": d, "income": i, "expense": e} for d, i, e in zip(dates, income, expense)])
+
+
+def fill_daily_series(rows: List[Dict[str, Any]]) -> Tuple[List[str], List[float], List[float]]:
+    """
+    Compat: mesma série de _fill_daily, em listas (dates, income, expense).
+    """
+    s = _fill_daily(rows)
+    return s.date_strs(), _as_list(s.income), _as_list(s.expense)
 
 
 def month_seq(start_ym: str, end_ym: str) -> List[str]:
@@ -562,22 +1184,38 @@ def fill_monthly_series(rows: List[Dict[str, Any]]) -> Tuple[List[str], List[flo
         return [], [], []
 
     by_ym: Dict[str, Dict[str, Any]] = {}
+    parsed: Dict[str, Any] = {}
     for r in rows:
         if not isinstance(r, dict):
             continue
         ym = (r.get("ym") or "").strip()
         if not ym:
             continue
-        # valida simples YYYY-MM
-        try:
-            datetime.strptime(ym + "-01", "%Y-%m-%d")
-        except Exception:
-            continue
+        # valida simples YYYY-MM (forma canônica pela regex; o resto via strptime)
+        if _YM_RE.match(ym):
+            parsed[ym] = ym
+        else:
+            try:
+                parsed[ym] = datetime.strptime(ym + "-01", "%Y-%m-%d")
+            except Exception:
+                continue
         by_ym[ym] = r
 
     if not by_ym:
         return [], [], []
 
+    if np is not None:
+        # datetime64[M] aceita tanto "YYYY-MM" quanto datetime
+        keys = np.array([np.datetime64(parsed[ym], "M") for ym in by_ym], dtype="datetime64[M]")
+        full = np.arange(keys.min(), keys.max() + 1, dtype="datetime64[M]")
+        pos = (keys - full[0]).astype(np.int64)
+
+        inc_arr = np.zeros(len(full), dtype=float)
+        exp_arr = np.zeros(len(full), dtype=float)
+        inc_arr[pos] = _float_col([r.get("income") for r in by_ym.values()])
+        exp_arr[pos] = _float_col([r.get("expense_total") for r in by_ym.values()])
+        return full.astype(str).tolist(), inc_arr.tolist(), exp_arr.tolist()
+
     start_ym = min(by_ym.keys())
     end_ym = max(by_ym.keys())
 
@@ -621,20 +1259,38 @@ def build_category_profile(
     if not valid_rows:
         return {}
 
-    rows = sorted(valid_rows, key=lambda r: r["date"])
-    unique_dates = sorted({r["date"] for r in rows})
-    idx_map = {d: i for i, d in enumerate(unique_dates)}
+    weights: Dict[str, float] = {}
+    if np is not None:
+        # índice do dia (entre datas únicas) -> peso exponencial -> soma por categoria (np.add.at)
+        u_dates, d_idx = np.unique(np.array([r["date"] for r in valid_rows]), return_inverse=True)
+        order = np.argsort(d_idx, kind="stable")  # mesma ordem de sorted(rows, key=date)
+
+        cats = [str(valid_rows[i].get("category") or "Outros") for i in order.tolist()]
+        vals = _float_col([valid_rows[i].get("expense") for i in order.tolist()])
+        w = decay ** ((len(u_dates) - 1) - d_idx[order])
+
+        pos = vals > 0
+        cats_pos = [c for c, ok in zip(cats, pos.tolist()) if ok]
+        cat_names = list(dict.fromkeys(cats_pos))  # ordem de 1ª aparição
+        cat_pos = {c: i for i, c in enumerate(cat_names)}
+
+        acc = np.zeros(len(cat_names), dtype=np.float64)
+        np.add.at(acc, np.array([cat_pos[c] for c in cats_pos], dtype=np.int64), vals[pos] * w[pos])
+        weights = dict(zip(cat_names, acc.tolist()))
+    else:
+        rows = sorted(valid_rows, key=lambda r: r["date"])
+        unique_dates = sorted({r["date"] for r in rows})
+        idx_map = {d: i for i, d in enumerate(unique_dates)}
 
-    T = len(unique_dates)
-    w_date = {d: (decay ** (T - 1 - idx_map[d])) for d in unique_dates}
+        T = len(unique_dates)
+        w_date = {d: (decay ** (T - 1 - idx_map[d])) for d in unique_dates}
 
-    weights: Dict[str, float] = {}
-    for r in rows:
-        cat = str(r.get("category") or "Outros")
-        v = _safe_float(r.get("expense"), 0.0)
-        if v <= 0:
-            continue
-        weights[cat] = weights.get(cat, 0.0) + (v * float(w_date.get(r["date"], 1.0)))
+        for r in rows:
+            cat = str(r.get("category") or "Outros")
+            v = _safe_float(r.get("expense"), 0.0)
+            if v <= 0:
+                continue
+            weights[cat] = weights.get(cat, 0.0) + (v * float(w_date.get(r["date"], 1.0)))
 
     if weights and smooth > 0:
         for k in list(weights.keys()):
@@ -643,6 +1299,27 @@ def build_category_profile(
     return weights
 
 
+def _category_shares(cat_weights: Dict[str, float]) -> Tuple[List[str], List[float]]:
+    """
+    Normaliza os pesos de categoria uma vez: (categorias, frações).
+    Sem pesos positivos devolve listas vazias (o chamador cai em "Outros").
+    """
+    if not cat_weights:
+        return [], []
+    ws = [float(max(0.0, float(v))) for v in cat_weights.values()]
+    total_w = float(sum(ws))
+    if total_w <= 0:
+        return [], []
+    return list(cat_weights.keys()), [w / total_w for w in ws]
+
+
+def _allocate_shares(expense_value: float, cats: List[str], shares: List[float]) -> Dict[str, float]:
+    """Rateio de expense_value pelas frações já normalizadas."""
+    if not cats:
+        return {"Outros": float(expense_value)}
+    return {cat: float(expense_value * sh) for cat, sh in zip(cats, shares)}
+
+
 def allocate_expense_to_categories(
     expense_value: float,
     cat_weights: Dict[str, float],
@@ -655,25 +1332,16 @@ def allocate_expense_to_categories(
     """
     expense_value = float(max(0.0, float(expense_value)))
 
-    if not cat_weights:
-        d = {"Outros": expense_value}
-        top = [{"category": "Outros", "amount": expense_value, "share": 1.0}]
-        return d, top
-
-    total_w = float(sum(max(0.0, float(v)) for v in cat_weights.values()))
-    if total_w <= 0:
+    cats, shares = _category_shares(cat_weights)
+    if not cats:
         d = {"Outros": expense_value}
         top = [{"category": "Outros", "amount": expense_value, "share": 1.0}]
         return d, top
 
-    alloc: Dict[str, float] = {}
-    for cat, w in cat_weights.items():
-        w = float(max(0.0, float(w)))
-        alloc[cat] = float(expense_value * (w / total_w))
+    alloc: Dict[str, float] = _allocate_shares(expense_value, cats, shares)
 
-    items = sorted(alloc.items(), key=lambda kv: kv[1], reverse=True)
     top = []
-    for cat, amt in items[:max(1, int(top_k))]:
+    for cat, amt in heapq.nlargest(max(1, int(top_k)), alloc.items(), key=itemgetter(1)):
         share = float(amt / expense_value) if expense_value > 0 else 0.0
         top.append({"category": cat, "amount": float(amt), "share": float(share)})
 
@@ -684,18 +1352,23 @@ def allocate_expense_to_categories(
 # Treino + payload (diário)
 # -----------------------------
 def train_daily_sklearn(
-    rows_daily_income_expense: List[Dict[str, Any]],
+    rows_daily_income_expense: Any,
     lags: int = 14,
     force_ml: bool = False,
 ) -> Dict[str, Any]:
     """
     Retorna payload treinado para daily.
+    - rows_daily_income_expense: lista de dicts por dia ou DailySeries já pronta (fill_daily_columns).
     - Se ML indisponível (numpy/sklearn): retorna baseline (sem levantar exceção).
     - Se histórico curto: baseline.
     """
-    dates, inc, exp = fill_daily_series(rows_daily_income_expense)
+    if isinstance(rows_daily_income_expense, DailySeries):
+        series = rows_daily_income_expense
+    else:
+        series = _fill_daily(rows_daily_income_expense)
+    n = len(series)
 
-    if not dates:
+    if not n:
         return {
             "basis": "cash_daily_sklearn",
             "trained_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
@@ -706,21 +1379,20 @@ def train_daily_sklearn(
         }
 
     lags = int(max(3, min(int(lags), 30)))
-    if len(dates) <= (lags + 5):
-        lags = int(max(3, min(lags, max(3, len(dates) // 3))))
+    if n <= (lags + 5):
+        lags = int(max(3, min(lags, max(3, n // 3))))
 
     # baseline por falta de dados
-    if len(dates) <= (lags + 2):
+    if n <= (lags + 2):
         return {
             "basis": "cash_daily_sklearn",
             "trained_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
             "lags": int(lags),
             "warning": "Histórico insuficiente para ML. Usando baseline sazonal.",
-            "history_tail": [{"date": d, "income": float(i), "expense": float(e), "net": float(i - e)}
-                             for d, i, e in zip(dates[-60:], inc[-60:], exp[-60:])],
+            "history_tail": series.tail_records(60),
             "targets": {
-                "income": TrainedTarget("baseline_seasonal", None, 0.0, 0.0, float(_std(inc))).__dict__,
-                "expense": TrainedTarget("baseline_seasonal", None, 0.0, 0.0, float(_std(exp))).__dict__,
+                "income": TrainedTarget("baseline_seasonal", None, 0.0, 0.0, float(_std(series.income))).__dict__,
+                "expense": TrainedTarget("baseline_seasonal", None, 0.0, 0.0, float(_std(series.expense))).__dict__,
             },
         }
 
@@ -731,26 +1403,23 @@ def train_daily_sklearn(
             "trained_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
             "lags": int(lags),
             "warning": f"ML indisponível ({_SKLEARN_IMPORT_ERROR}). Usando baseline sazonal.",
-            "history_tail": [{"date": d, "income": float(i), "expense": float(e), "net": float(i - e)}
-                             for d, i, e in zip(dates[-90:], inc[-90:], exp[-90:], )],
+            "history_tail": series.tail_records(90),
             "targets": {
-                "income": TrainedTarget("baseline_seasonal", None, 0.0, 0.0, float(_std(inc))).__dict__,
-                "expense": TrainedTarget("baseline_seasonal", None, 0.0, 0.0, float(_std(exp))).__dict__,
+                "income": TrainedTarget("baseline_seasonal", None, 0.0, 0.0, float(_std(series.income))).__dict__,
+                "expense": TrainedTarget("baseline_seasonal", None, 0.0, 0.0, float(_std(series.expense))).__dict__,
             },
         }
 
-    X, y_inc, y_exp = _make_supervised_daily(dates, inc, exp, lags=lags)
-    dates_y = dates[lags:]  # y começa em dates[lags:]
+    X, y_inc, y_exp = _make_supervised_daily(series.dates, series.income, series.expense, lags=lags)
+    dates_y = series.dates[lags:]  # y começa em dates[lags:]
 
-    t_inc = _fit_one_target(X, y_inc, dates_for_baseline=dates_y, force_ml=bool(force_ml))
-    t_exp = _fit_one_target(X, y_exp, dates_for_baseline=dates_y, force_ml=bool(force_ml))
+    t_inc, t_exp = _fit_targets(X, y_inc, y_exp, dates_for_baseline=dates_y, force_ml=bool(force_ml))
 
     return {
         "basis": "cash_daily_sklearn",
         "trained_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
         "lags": int(lags),
-        "history_tail": [{"date": d, "income": float(i), "expense": float(e), "net": float(i - e)}
-                         for d, i, e in zip(dates[-90:], inc[-90:], exp[-90:])],
+        "history_tail": series.tail_records(90),
         "targets": {
             "income": t_inc.__dict__,
             "expense": t_exp.__dict__,
@@ -773,22 +1442,30 @@ def _predict_one(
     baseline_hist_vals: List[float],
     target_date: str,
     X: Optional[Any] = None,
+    baseline_hist_dows: Optional[List[int]] = None,
+    target_dow: Optional[int] = None,
 ) -> float:
     """
     Predição 1-step robusta.
     - Se baseline: sempre funciona (não depende de numpy)
     - Se ML mas model=None/X=None: cai para baseline
     """
+    def _baseline() -> float:
+        return float(_baseline_seasonal_predict_one(
+            baseline_hist_dates, baseline_hist_vals, target_date,
+            history_dows=baseline_hist_dows, target_dow=target_dow,
+        ))
+
     if algo == "baseline_seasonal":
-        return float(_baseline_seasonal_predict_one(baseline_hist_dates, baseline_hist_vals, target_date))
+        return _baseline()
 
     if model is None or X is None:
-        return float(_baseline_seasonal_predict_one(baseline_hist_dates, baseline_hist_vals, target_date))
+        return _baseline()
 
     try:
         return float(model.predict(X)[0])
     except Exception:
-        return float(_baseline_seasonal_predict_one(baseline_hist_dates, baseline_hist_vals, target_date))
+        return _baseline()
 
 def _today_ymd_local() -> str:
     """
@@ -833,6 +1510,15 @@ def _extend_series_until_anchor_with_zeros(
     if target_last <= last:
         return dates, inc_vals, exp_vals
 
+    if np is not None:
+        extra = np.arange(
+            np.datetime64(last.date()) + 1, np.datetime64(target_last.date()) + 1, dtype="datetime64[D]"
+        ).astype(str).tolist()
+        dates.extend(extra)
+        inc_vals.extend([0.0] * len(extra))
+        exp_vals.extend([0.0] * len(extra))
+        return dates, inc_vals, exp_vals
+
     cur = last + timedelta(days=1)
     while cur <= target_last:
         ds = cur.strftime("%Y-%m-%d")
@@ -844,6 +1530,86 @@ def _extend_series_until_anchor_with_zeros(
     return dates, inc_vals, exp_vals
 
 
+# -----------------------------
+# Cache de previsões
+# -----------------------------
+# Previsão é função determinística de (payload, parâmetros): polling/refresh do
+# dashboard reaproveita o resultado. A chave é o hash do conteúdo do payload
+# (retreino => payload novo => chave nova); TTL curto cobre a virada do dia.
+_PRED_CACHE_MAX = 512
+_PRED_CACHE_TTL_S = 300.0
+_PRED_CACHE: "OrderedDict[bytes, Tuple[float, Any]]" = OrderedDict()
+_PRED_CACHE_LOCK = threading.Lock()
+
+
+def _hash_bytes(raw: bytes) -> bytes:
+    if xxhash is not None:
+        return xxhash.xxh3_128_digest(raw)
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+
+def _dumps_for_key(obj: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(
+                obj,
+                default=str,
+                option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+            )
+        except Exception:
+            pass
+    return json.dumps(obj, sort_keys=True, default=str, separators=(",", ":")).encode("utf-8")
+
+
+# Fingerprint do payload memoizado por identidade: o servidor reaproveita o mesmo dict
+# decodificado entre requests, então o hash do conteúdo (modelos em base64, centenas de KB)
+# sai uma vez por modelo e não a cada previsão. Guarda a referência ao payload para o id()
+# não ser reaproveitado; payloads carregados são tratados como somente leitura.
+_PAYLOAD_FP_MAX = 64
+_PAYLOAD_FP: "OrderedDict[int, Tuple[Dict[str, Any], bytes]]" = OrderedDict()
+
+
+def _payload_fingerprint(payload: Dict[str, Any]) -> bytes:
+    pid = id(payload)
+    with _PRED_CACHE_LOCK:
+        hit = _PAYLOAD_FP.get(pid)
+        if hit is not None and hit[0] is payload:
+            _PAYLOAD_FP.move_to_end(pid)
+            return hit[1]
+
+    fp = _hash_bytes(_dumps_for_key(payload))
+    with _PRED_CACHE_LOCK:
+        _PAYLOAD_FP[pid] = (payload, fp)
+        _PAYLOAD_FP.move_to_end(pid)
+        while len(_PAYLOAD_FP) > _PAYLOAD_FP_MAX:
+            _PAYLOAD_FP.popitem(last=False)
+    return fp
+
+
+def _pred_cache_key(kind: str, payload: Dict[str, Any], *args: Any) -> bytes:
+    return _hash_bytes(_dumps_for_key([kind, _payload_fingerprint(payload).hex(), args]))
+
+
+def _pred_cached(key: bytes, compute) -> Any:
+    """
+    Devolve cópia (deepcopy) para o chamador poder alterar o resultado sem sujar o cache.
+    """
+    now = time.monotonic()
+    with _PRED_CACHE_LOCK:
+        hit = _PRED_CACHE.get(key)
+        if hit is not None and (now - hit[0]) < _PRED_CACHE_TTL_S:
+            _PRED_CACHE.move_to_end(key)
+            return copy.deepcopy(hit[1])
+
+    val = compute()
+    with _PRED_CACHE_LOCK:
+        _PRED_CACHE[key] = (now, val)
+        _PRED_CACHE.move_to_end(key)
+        while len(_PRED_CACHE) > _PRED_CACHE_MAX:
+            _PRED_CACHE.popitem(last=False)
+    return copy.deepcopy(val)
+
+
 # -----------------------------
 # Forecast diário — V2 (objeto completo)
 # -----------------------------
@@ -853,6 +1619,26 @@ def forecast_next_days_daily_v2(
     rows_expense_by_category_daily: Optional[List[Dict[str, Any]]] = None,
     top_k_categories: int = 8,
     anchor_date: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Retorna forecast completo para UI (V2), com cache por conteúdo (ver _forecast_next_days_daily_v2).
+    """
+    # sem anchor_date a previsão depende do dia local: entra na chave já resolvida
+    key = _pred_cache_key(
+        "daily", payload, int(days), rows_expense_by_category_daily, int(top_k_categories),
+        anchor_date or _today_ymd_local(),
+    )
+    return _pred_cached(key, lambda: _forecast_next_days_daily_v2(
+        payload, days, rows_expense_by_category_daily, top_k_categories, anchor_date
+    ))
+
+
+def _forecast_next_days_daily_v2(
+    payload: Dict[str, Any],
+    days: int = 7,
+    rows_expense_by_category_daily: Optional[List[Dict[str, Any]]] = None,
+    top_k_categories: int = 8,
+    anchor_date: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Retorna forecast completo para UI (V2):
@@ -931,58 +1717,116 @@ def forecast_next_days_daily_v2(
         exp_model = None
 
     cat_profile = build_category_profile(rows_expense_by_category_daily or [])
+    # frações por categoria: normalizadas uma vez, o loop só multiplica
+    cat_names, cat_shares = _category_shares(cat_profile)
 
     # A previsão sempre parte do último dia *da série estendida*
     last_dt = datetime.strptime(dates[-1], "%Y-%m-%d")
     preds: List[Dict[str, Any]] = []
 
-    for h in range(1, days + 1):
-        fdt = last_dt + timedelta(days=h)
-        fdate = fdt.strftime("%Y-%m-%d")
-        t_idx = (len(dates) - 1) + h
+    # dia da semana de cada data do histórico, calculado uma vez (o baseline usa a cada passo)
+    dows = [_weekday(d) for d in dates]
 
-        # lags
-        eff_lags = int(min(lags, len(inc_vals), len(exp_vals), 30))
-        eff_lags = max(3, eff_lags)
+    # Os 2 alvos no baseline: roll-out inteiro num único kernel (numba quando disponível)
+    base_path = None
+    if np is not None and inc_algo == "baseline_seasonal" and exp_algo == "baseline_seasonal":
+        base_path = _baseline_rollout(dows, inc_vals, exp_vals, last_dt.weekday(), days)
 
-        inc_lags = [inc_vals[-k] for k in range(1, eff_lags + 1)]
-        exp_lags = [exp_vals[-k] for k in range(1, eff_lags + 1)]
-        feats = _date_feats(fdate, t_idx)
+    # Com algum alvo em ML: buffers numpy pré-alocados (histórico + horizonte);
+    # lags saem como views invertidas, sem montar listas por dia
+    use_ml = np is not None and (
+        (inc_algo != "baseline_seasonal" and inc_model is not None) or
+        (exp_algo != "baseline_seasonal" and exp_model is not None)
+    )
+    stacked = None
+    if use_ml:
+        n_hist = len(inc_vals)
+        inc_buf = np.empty(n_hist + days, dtype=np.float64)
+        exp_buf = np.empty(n_hist + days, dtype=np.float64)
+        inc_buf[:n_hist] = inc_vals
+        exp_buf[:n_hist] = exp_vals
+
+        if inc_algo != "baseline_seasonal" and exp_algo != "baseline_seasonal":
+            stacked = _stack_linear(inc_model, exp_model)
+
+        # features de calendário não dependem das previsões: bloco (days, 8) calculado de uma vez.
+        # t_idx do passo h = (len(dates) - 1) + h, com dates crescendo 1 por passo
+        date_block = _date_feats_vec(
+            [(last_dt + timedelta(days=h)).strftime("%Y-%m-%d") for h in range(1, days + 1)],
+            np.array([(n_hist - 1) + (h - 1) + h for h in range(1, days + 1)], dtype=np.int64),
+        )
+    X_row = None
 
-        inc_ma7 = _rolling_mean(inc_vals, 7)
-        inc_ma14 = _rolling_mean(inc_vals, 14)
-        exp_ma7 = _rolling_mean(exp_vals, 7)
-        exp_ma14 = _rolling_mean(exp_vals, 14)
+    # somas acumuladas: médias móveis em O(1) por passo (atualizadas na recursão)
+    csum_inc = _prefix_sums(inc_vals)
+    csum_exp = _prefix_sums(exp_vals)
+    csum_net = _prefix_sums(a - b for a, b in zip(inc_vals, exp_vals))
 
-        net_last = float(inc_vals[-1] - exp_vals[-1])
-        net_ma7 = float(_rolling_mean([a - b for a, b in zip(inc_vals[-30:], exp_vals[-30:])], 7))
+    for h in range(1, days + 1):
+        fdt = last_dt + timedelta(days=h)
+        fdate = fdt.strftime("%Y-%m-%d")
+        fdow = fdt.weekday()
 
-        X = None
-        if np is not None and (
-            (inc_algo != "baseline_seasonal" and inc_model is not None) or
-            (exp_algo != "baseline_seasonal" and exp_model is not None)
-        ):
-            X = np.array([feats + inc_lags + exp_lags + [inc_ma7, inc_ma14, exp_ma7, exp_ma14, net_last, net_ma7]], dtype=float)
-
-        inc_pred = _predict_one(
-            algo=inc_algo,
-            model=inc_model,
-            baseline_hist_dates=dates,
-            baseline_hist_vals=inc_vals,
-            target_date=fdate,
-            X=X,
-        )
-        inc_pred = max(0.0, float(inc_pred))
-
-        exp_pred = _predict_one(
-            algo=alerts if False else exp_algo,  # não muda nada; só evita "variável não usada" em alguns linters
-            model=exp_model,
-            baseline_hist_dates=dates,
-            baseline_hist_vals=exp_vals,
-            target_date=fdate,
-            X=X,
-        )
-        exp_pred = max(0.0, float(exp_pred))
+        if base_path is not None:
+            inc_pred = float(base_path[0][h - 1])
+            exp_pred = float(base_path[1][h - 1])
+        else:
+            X = None
+            if use_ml:
+                t = len(inc_vals)
+                eff_lags = max(3, int(min(lags, t, 30)))
+
+                # linha de features reaproveitada entre os passos (só realoca se eff_lags mudar)
+                n_feat = _N_DATE_FEATS + 2 * eff_lags + 6
+                if X_row is None or X_row.shape[1] != n_feat:
+                    X_row = np.empty((1, n_feat), dtype=np.float64)
+                X = X_row
+                row = X[0]
+
+                row[:_N_DATE_FEATS] = date_block[h - 1]
+                off = _N_DATE_FEATS
+                row[off:off + eff_lags] = inc_buf[t - eff_lags:t][::-1]
+                off += eff_lags
+                row[off:off + eff_lags] = exp_buf[t - eff_lags:t][::-1]
+                off += eff_lags
+                row[off:] = (
+                    _prefix_mean(csum_inc, 7),
+                    _prefix_mean(csum_inc, 14),
+                    _prefix_mean(csum_exp, 7),
+                    _prefix_mean(csum_exp, 14),
+                    float(inc_vals[-1] - exp_vals[-1]),
+                    _prefix_mean(csum_net, 7),
+                )
+
+            if stacked is not None and X is not None and X.shape[1] == stacked[0].shape[0]:
+                # income e expense lineares: uma multiplicação para os dois
+                y2 = X[0] @ stacked[0] + stacked[1]
+                inc_pred = max(0.0, float(y2[0]))
+                exp_pred = max(0.0, float(y2[1]))
+            else:
+                inc_pred = _predict_one(
+                    algo=inc_algo,
+                    model=inc_model,
+                    baseline_hist_dates=dates,
+                    baseline_hist_vals=inc_vals,
+                    target_date=fdate,
+                    X=X,
+                    baseline_hist_dows=dows,
+                    target_dow=fdow,
+                )
+                inc_pred = max(0.0, float(inc_pred))
+
+                exp_pred = _predict_one(
+                    algo=alerts if False else exp_algo,  # não muda nada; só evita "variável não usada" em alguns linters
+                    model=exp_model,
+                    baseline_hist_dates=dates,
+                    baseline_hist_vals=exp_vals,
+                    target_date=fdate,
+                    X=X,
+                    baseline_hist_dows=dows,
+                    target_dow=fdow,
+                )
+                exp_pred = max(0.0, float(exp_pred))
 
         net_pred = float(inc_pred - exp_pred)
 
@@ -990,7 +1834,7 @@ def forecast_next_days_daily_v2(
         inc_low, inc_high = max(0.0, inc_pred - z * inc_std), inc_pred + z * inc_std
         exp_low, exp_high = max(0.0, exp_pred - z * exp_std), exp_pred + z * exp_std
 
-        exp_by_cat, _ = allocate_expense_to_categories(exp_pred, cat_profile, top_k=top_k_categories)
+        exp_by_cat = _allocate_shares(exp_pred, cat_names, cat_shares)
 
         preds.append({
             "date": fdate,
@@ -1005,23 +1849,27 @@ def forecast_next_days_daily_v2(
         })
 
         # recursão
+        if use_ml:
+            inc_buf[len(inc_vals)] = inc_pred
+            exp_buf[len(exp_vals)] = exp_pred
         inc_vals.append(float(inc_pred))
         exp_vals.append(float(exp_pred))
         dates.append(fdate)
+        dows.append(fdow)
+        csum_inc.append(csum_inc[-1] + float(inc_pred))
+        csum_exp.append(csum_exp[-1] + float(exp_pred))
+        csum_net.append(csum_net[-1] + net_pred)
 
     income_total = float(sum(p["income_pred"] for p in preds))
     expense_total = float(sum(p["expense_pred"] for p in preds))
     net_total = float(income_total - expense_total)
 
-    # categorias agregadas
-    cat_sum: Dict[str, float] = {}
-    for p in preds:
-        for cat, amt in (p.get("expense_by_category") or {}).items():
-            cat_sum[cat] = float(cat_sum.get(cat, 0.0) + float(amt))
+    # categorias agregadas: o rateio é proporcional, então a soma por categoria
+    # é a fração aplicada ao total do horizonte
+    cat_sum: Dict[str, float] = _allocate_shares(expense_total, cat_names, cat_shares) if preds else {}
 
-    top_cats = sorted(cat_sum.items(), key=lambda kv: kv[1], reverse=True)
     top_categories = []
-    for cat, amt in top_cats[:max(1, int(top_k_categories))]:
+    for cat, amt in heapq.nlargest(max(1, int(top_k_categories)), cat_sum.items(), key=itemgetter(1)):
         share = float(amt / expense_total) if expense_total > 0 else 0.0
         top_categories.append({"category": cat, "amount": float(amt), "share": float(share)})
 
@@ -1029,7 +1877,9 @@ def forecast_next_days_daily_v2(
     alerts_out = []
     risk = 0
 
-    hist_exp = [float(x) for x in exp_vals[-60:]]  # já inclui zeros se houve buraco
+    # janela de 60 dias (já inclui zeros se houve buraco); exp_vals já guarda floats,
+    # então vai direto para numpy (uma conversão, média e desvio em C)
+    hist_exp = np.asarray(exp_vals[-60:], dtype=np.float64) if np is not None else exp_vals[-60:]
     mu = _mean(hist_exp)
     sigma = _std(hist_exp)
 
@@ -1098,27 +1948,6 @@ def forecast_next_days_daily_response(
     top_k_categories: int = 8,
     mode: str = "v2",
     anchor_date: Optional[str] = None,
-) -> Any:
-    mode = (mode or "v2").strip().lower()
-    if mode == "v1_list":
-        return forecast_next_days_daily_v1_list(
-            payload, days, rows_expense_by_category_daily, top_k_categories, anchor_date
-        )
-    return forecast_next_days_daily_v2(
-        payload, days, rows_expense_by_category_daily, top_k_categories, anchor_date
-    )
-
-
-# Mantém compatibilidade de nome (se você já chama forecast_next_days_daily)
-forecast_next_days_daily = forecast_next_days_daily_v2
-
-
-def forecast_next_days_daily_response(
-    payload: Dict[str, Any],
-    days: int = 7,
-    rows_expense_by_category_daily: Optional[List[Dict[str, Any]]] = None,
-    top_k_categories: int = 8,
-    mode: str = "v2",
 ) -> Any:
     """
     Helper para o ENDPOINT decidir o formato sem refatorar tudo.
@@ -1129,8 +1958,12 @@ def forecast_next_days_daily_response(
     """
     mode = (mode or "v2").strip().lower()
     if mode == "v1_list":
-        return forecast_next_days_daily_v1_list(payload, days, rows_expense_by_category_daily, top_k_categories)
-    return forecast_next_days_daily_v2(payload, days, rows_expense_by_category_daily, top_k_categories)
+        return forecast_next_days_daily_v1_list(
+            payload, days, rows_expense_by_category_daily, top_k_categories, anchor_date
+        )
+    return forecast_next_days_daily_v2(
+        payload, days, rows_expense_by_category_daily, top_k_categories, anchor_date
+    )
 
 
 # Mantém compatibilidade de nome (se você já chama forecast_next_days_daily)
@@ -1167,8 +2000,7 @@ def train_monthly_sklearn(
             "trained_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
             "lags": int(lags),
             "warning": "Histórico insuficiente para ML. Usando baseline sazonal.",
-            "history": [{"ym": ym, "income": float(i), "expense_total": float(e), "balance": float(i - e)}
-                        for ym, i, e in zip(yms, inc, exp)],
+            "history": _monthly_history(yms, inc, exp),
             "targets": {
                 "income": TrainedTarget("baseline_seasonal", None, 0.0, 0.0, float(_std(inc))).__dict__,
                 "expense_total": TrainedTarget("baseline_seasonal", None, 0.0, 0.0, float(_std(exp))).__dict__,
@@ -1182,8 +2014,7 @@ def train_monthly_sklearn(
             "trained_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
             "lags": int(lags),
             "warning": f"ML indisponível ({_SKLEARN_IMPORT_ERROR}). Usando baseline sazonal.",
-            "history": [{"ym": ym, "income": float(i), "expense_total": float(e), "balance": float(i - e)}
-                        for ym, i, e in zip(yms, inc, exp)],
+            "history": _monthly_history(yms, inc, exp),
             "targets": {
                 "income": TrainedTarget("baseline_seasonal", None, 0.0, 0.0, float(_std(inc))).__dict__,
                 "expense_total": TrainedTarget("baseline_seasonal", None, 0.0, 0.0, float(_std(exp))).__dict__,
@@ -1192,8 +2023,7 @@ def train_monthly_sklearn(
 
     X, y_inc, y_exp = _make_supervised_monthly(yms, inc, exp, lags=lags)
 
-    t_inc = _fit_one_target(X, y_inc, dates_for_baseline=None, force_ml=bool(force_ml))
-    t_exp = _fit_one_target(X, y_exp, dates_for_baseline=None, force_ml=bool(force_ml))
+    t_inc, t_exp = _fit_targets(X, y_inc, y_exp, dates_for_baseline=None, force_ml=bool(force_ml))
 
     return {
         "basis": "competencia_sklearn",
@@ -1201,8 +2031,7 @@ def train_monthly_sklearn(
         "lags": int(lags),
         "start_ym": yms[0],
         "end_ym": yms[-1],
-        "history": [{"ym": ym, "income": float(i), "expense_total": float(e), "balance": float(i - e)}
-                    for ym, i, e in zip(yms, inc, exp)],
+        "history": _monthly_history(yms, inc, exp),
         "targets": {
             "income": t_inc.__dict__,
             "expense_total": t_exp.__dict__,
@@ -1222,6 +2051,14 @@ def _add_months(ym: str, delta: int) -> str:
 
 
 def forecast_next_months(payload: Dict[str, Any], horizon: int = 12) -> Dict[str, Any]:
+    """
+    Forecast mensal (competência), com cache por conteúdo do payload.
+    """
+    key = _pred_cache_key("monthly", payload, int(horizon))
+    return _pred_cached(key, lambda: _forecast_next_months(payload, horizon))
+
+
+def _forecast_next_months(payload: Dict[str, Any], horizon: int = 12) -> Dict[str, Any]:
     horizon = int(horizon)
     if horizon < 1 or horizon > 24:
         raise ValueError("horizon deve estar entre 1 e 24.")
@@ -1237,9 +2074,14 @@ def forecast_next_months(payload: Dict[str, Any], horizon: int = 12) -> Dict[str
 
     lags = int(payload.get("lags", 6))
 
-    yms = [str(r.get("ym") or "").strip() for r in hist if (r.get("ym") or "").strip()]
-    inc_vals = [_safe_float(r.get("income"), 0.0) for r in hist if (str(r.get("ym") or "").strip())]
-    exp_vals = [_safe_float(r.get("expense_total"), 0.0) for r in hist if (str(r.get("ym") or "").strip())]
+    # uma passada só: (ym, income, expense_total) por linha válida, depois transpõe com zip
+    rows = [
+        (ym, _safe_float(r.get("income"), 0.0), _safe_float(r.get("expense_total"), 0.0))
+        for r in hist
+        for ym in (str(r.get("ym") or "").strip(),)
+        if ym
+    ]
+    yms, inc_vals, exp_vals = (list(c) for c in zip(*rows)) if rows else ([], [], [])
 
     if not yms:
         return {
@@ -1282,44 +2124,74 @@ def forecast_next_months(payload: Dict[str, Any], horizon: int = 12) -> Dict[str
     last_ym = yms[-1]
     preds = []
 
+    csum_inc = _prefix_sums(inc_vals)
+    csum_exp = _prefix_sums(exp_vals)
+    csum_net = _prefix_sums(a - b for a, b in zip(inc_vals, exp_vals))
+
+    # linha de features alocada uma vez e sobrescrita a cada mês (só com algum alvo em ML)
+    X_row = None
+    stacked = None
+    if np is not None and ((inc_algo != "baseline_seasonal" and inc_model is not None) or (exp_algo != "baseline_seasonal" and exp_model is not None)):
+        X_row = np.empty((1, _N_YM_FEATS + 2 * lags + 6), dtype=np.float64)
+        if inc_algo != "baseline_seasonal" and exp_algo != "baseline_seasonal":
+            stacked = _stack_linear(inc_model, exp_model)
+            if stacked is not None and stacked[0].shape[0] != X_row.shape[1]:
+                stacked = None
+        ym_block = _ym_feats_vec(
+            [_add_months(last_ym, h) for h in range(1, horizon + 1)],
+            np.array([(len(yms) - 1) + h for h in range(1, horizon + 1)], dtype=np.int64),
+        )
+
     for h in range(1, horizon + 1):
         fym = _add_months(last_ym, h)
-        t_idx = (len(yms) - 1) + h
-
-        inc_lags = [inc_vals[-k] for k in range(1, lags + 1)]
-        exp_lags = [exp_vals[-k] for k in range(1, lags + 1)]
-        feats = _ym_feats(fym, t_idx)
 
-        inc_ma3 = _rolling_mean(inc_vals, 3)
-        inc_ma6 = _rolling_mean(inc_vals, 6)
-        exp_ma3 = _rolling_mean(exp_vals, 3)
-        exp_ma6 = _rolling_mean(exp_vals, 6)
-
-        net_last = float(inc_vals[-1] - exp_vals[-1])
-        net_ma3 = float(_rolling_mean([a - b for a, b in zip(inc_vals[-18:], exp_vals[-18:])], 3))
+        inc_ma3 = _prefix_mean(csum_inc, 3)
+        exp_ma3 = _prefix_mean(csum_exp, 3)
 
         X = None
-        if np is not None and ((inc_algo != "baseline_seasonal" and inc_model is not None) or (exp_algo != "baseline_seasonal" and exp_model is not None)):
-            X = np.array([feats + inc_lags + exp_lags + [inc_ma3, inc_ma6, exp_ma3, exp_ma6, net_last, net_ma3]], dtype=float)
-
-        # baseline simples em mensal
-        if inc_algo == "baseline_seasonal" or inc_model is None or X is None:
-            inc_pred = float(_rolling_mean(inc_vals, 3))
-        else:
-            try:
-                inc_pred = float(inc_model.predict(X)[0])
-            except Exception:
-                inc_pred = float(_rolling_mean(inc_vals, 3))
-        inc_pred = max(0.0, inc_pred)
+        if X_row is not None:
+            X = X_row
+            row = X[0]
+
+            row[:_N_YM_FEATS] = ym_block[h - 1]
+            off = _N_YM_FEATS
+            row[off:off + lags] = inc_vals[:-lags - 1:-1]
+            off += lags
+            row[off:off + lags] = exp_vals[:-lags - 1:-1]
+            off += lags
+            row[off:] = (
+                inc_ma3,
+                _prefix_mean(csum_inc, 6),
+                exp_ma3,
+                _prefix_mean(csum_exp, 6),
+                float(inc_vals[-1] - exp_vals[-1]),
+                _prefix_mean(csum_net, 3),
+            )
 
-        if exp_algo == "baseline_seasonal" or exp_model is None or X is None:
-            exp_pred = float(_rolling_mean(exp_vals, 3))
+        if stacked is not None:
+            # income e expense_total lineares: uma multiplicação para os dois
+            y2 = X[0] @ stacked[0] + stacked[1]
+            inc_pred = max(0.0, float(y2[0]))
+            exp_pred = max(0.0, float(y2[1]))
         else:
-            try:
-                exp_pred = float(exp_model.predict(X)[0])
-            except Exception:
-                exp_pred = float(_rolling_mean(exp_vals, 3))
-        exp_pred = max(0.0, exp_pred)
+            # baseline simples em mensal
+            if inc_algo == "baseline_seasonal" or inc_model is None or X is None:
+                inc_pred = inc_ma3
+            else:
+                try:
+                    inc_pred = float(inc_model.predict(X)[0])
+                except Exception:
+                    inc_pred = inc_ma3
+            inc_pred = max(0.0, inc_pred)
+
+            if exp_algo == "baseline_seasonal" or exp_model is None or X is None:
+                exp_pred = exp_ma3
+            else:
+                try:
+                    exp_pred = float(exp_model.predict(X)[0])
+                except Exception:
+                    exp_pred = exp_ma3
+            exp_pred = max(0.0, exp_pred)
 
         bal_pred = float(inc_pred - exp_pred)
 
@@ -1340,6 +2212,9 @@ def forecast_next_months(payload: Dict[str, Any], horizon: int = 12) -> Dict[str
 
         inc_vals.append(float(inc_pred))
         exp_vals.append(float(exp_pred))
+        csum_inc.append(csum_inc[-1] + float(inc_pred))
+        csum_exp.append(csum_exp[-1] + float(exp_pred))
+        csum_net.append(csum_net[-1] + bal_pred)
 
     income_total = float(sum(p["income_pred"] for p in preds))
     expense_total = float(sum(p["expense_pred"] for p in preds))
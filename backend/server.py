@@ -18,25 +18,36 @@
 
 from __future__ import annotations
 
+import asyncio
+import calendar
 import csv
+import hashlib
 import io
 import json
 import os
+import re
 import sqlite3
-import urllib.error
-import urllib.request
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from contextlib import contextmanager, asynccontextmanager
 from datetime import datetime
-from typing import Any, Dict, Literal, Optional
+from functools import lru_cache
+from typing import Annotated, Any, Callable, Dict, Literal, Optional
 
+import httpx
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel, Field
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
 
 # Forecast (sklearn)
 from ml_forecast import (
+    DailySeries,
+    fill_daily_columns,
     train_daily_sklearn,
     forecast_next_days_daily,
     train_monthly_sklearn,
@@ -96,6 +107,8 @@ GROQ_BASE = "https://api.groq.com/openai/v1"
 TURSO_DATABASE_URL = _env_str("TURSO_DATABASE_URL", "")
 TURSO_AUTH_TOKEN = _env_str("TURSO_AUTH_TOKEN", "")
 TURSO_SYNC_INTERVAL = _env_int("TURSO_SYNC_INTERVAL", 60)
+
+AI_CACHE_TTL_S = _env_int("AI_CACHE_TTL_S", 900)  # 0 desliga o cache de respostas da AI
 USE_TURSO = bool(TURSO_DATABASE_URL and TURSO_AUTH_TOKEN)
 
 # CORS (origens permitidas)
@@ -125,6 +138,17 @@ CATEGORY_CARD_PAYMENT = "Cartão de Crédito (Pagamento)"  # NÃO é despesa rea
 TxType = Literal["income", "expense"]
 PurchaseStatus = Literal["pending", "paid"]
 ExportFormat = Literal["json", "csv"]
+ReportLayout = Literal["rows", "columnar"]
+
+# Parâmetros validados pelo FastAPI/pydantic-core antes de chegar na rota (422 automático)
+YM_PATTERN = r"^[0-9]{4}-(0[1-9]|1[0-2])$"
+Month = Annotated[int, Query(ge=1, le=12)]
+YearMonth = Annotated[str, Query(pattern=YM_PATTERN)]
+# Limites do forecast (os mesmos que o ml_forecast aplica): 422 antes de tocar no banco
+ForecastDays = Annotated[int, Query(ge=1, le=60)]
+ForecastHorizon = Annotated[int, Query(ge=1, le=24)]
+ForecastLags = Annotated[int, Query(ge=1, le=36)]
+MinMonths = Annotated[int, Query(ge=1, le=120)]
 
 # ============================================================
 # libsql opcional
@@ -134,6 +158,32 @@ try:
 except Exception:
     libsql = None
 
+# ============================================================
+# orjson opcional (serialização das respostas e do payload da Groq)
+# ============================================================
+try:
+    import orjson  # pip install orjson
+    from fastapi.responses import ORJSONResponse as _DefaultResponse
+except Exception:
+    orjson = None
+    from fastapi.responses import JSONResponse as _DefaultResponse
+
+
+def json_dumps(obj: Any) -> bytes:
+    """JSON compacto em UTF-8 (orjson se disponível; json da stdlib como fallback)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass  # ex.: inteiros > 64 bits — cai para a stdlib
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def json_loads(raw: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
 
 def now_iso() -> str:
     return datetime.utcnow().isoformat(timespec="seconds") + "Z"
@@ -176,30 +226,104 @@ def get_conn():
                 auth_token=TURSO_AUTH_TOKEN,
             )
     else:
-        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
+        # cache de statements por conexão (chave = texto do SQL): com a conexão
+        # reaproveitada no pool, as consultas das rotas quentes não são re-parseadas
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=256)
+        # sem row_factory: linhas como tuplas (C puro) e q_all/q_one montam o dict com os
+        # nomes de cur.description uma vez por consulta, igual ao caminho do libSQL
 
     # pragmas (se suportado)
     try:
         conn.execute("PRAGMA foreign_keys = ON;")
         conn.execute("PRAGMA journal_mode = WAL;")
         conn.execute("PRAGMA synchronous = NORMAL;")
+        if not USE_TURSO:
+            # conexão fica aberta (pool por thread): vale aquecer cache/mmap uma vez
+            conn.execute("PRAGMA cache_size = -16384;")  # ~16 MiB por conexão
+            conn.execute("PRAGMA mmap_size = 268435456;")
+            conn.execute("PRAGMA temp_store = MEMORY;")
     except Exception:
         pass
 
     return conn
 
 
+# Pool por thread (SQLite local): o threadpool do FastAPI reaproveita as threads,
+# então cada worker mantém a própria conexão entre requests. Com WAL, leitores
+# não bloqueiam o escritor. Turso/libSQL mantém abrir/fechar por request.
+_TLS = threading.local()
+_POOL_LOCK = threading.Lock()
+_POOL_CONNS: list[Any] = []
+_POOL_STATS = {"opened": 0, "acquired": 0, "released": 0}
+
+
+def _pool_count(key: str) -> None:
+    with _POOL_LOCK:
+        _POOL_STATS[key] += 1
+
+
+def _pooled_conn() -> Any:
+    conn = getattr(_TLS, "conn", None)
+    if conn is None:
+        conn = get_conn()
+        _TLS.conn = conn
+        with _POOL_LOCK:
+            _POOL_CONNS.append(conn)
+            _POOL_STATS["opened"] += 1
+    _pool_count("acquired")
+    return conn
+
+
+def pool_stats() -> dict:
+    with _POOL_LOCK:
+        out = dict(_POOL_STATS)
+        out["open"] = len(_POOL_CONNS)
+    out["in_use"] = out["acquired"] - out["released"]
+    out["mode"] = "per_request" if USE_TURSO else "thread_local"
+    return out
+
+
+def close_pool() -> None:
+    with _POOL_LOCK:
+        conns = list(_POOL_CONNS)
+        _POOL_CONNS.clear()
+    for conn in conns:
+        try:
+            # recomendação do SQLite ao fechar: re-analisa só as tabelas cujos índices
+            # foram usados nesta conexão e estão sem estatística (ou desatualizada)
+            conn.execute("PRAGMA optimize;")
+        except Exception:
+            pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
 @contextmanager
 def db():
-    conn = get_conn()
+    if USE_TURSO:
+        conn = get_conn()
+        try:
+            yield conn
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        return
+
+    conn = _pooled_conn()
     try:
         yield conn
     finally:
+        # request que falhou antes do commit não deixa transação aberta na conexão reaproveitada
         try:
-            conn.close()
+            if conn.in_transaction:
+                conn.rollback()
         except Exception:
             pass
+        _pool_count("released")
 
 
 def _rows_to_dicts(cur: Any, rows: list[Any]) -> list[dict]:
@@ -226,6 +350,91 @@ def q_all(conn: Any, sql: str, params: tuple = ()) -> list[dict]:
     return _rows_to_dicts(cur, rows)
 
 
+def q_columns(conn: Any, sql: str, params: tuple = ()) -> dict:
+    """
+    Resultado colunar: {"columns": [nomes], "data": [valores da coluna 0, ...]}.
+    Transpõe as tuplas com zip (C puro), sem montar um dict por linha.
+    """
+    cur = conn.execute(sql, params)
+    rows = cur.fetchall()
+    columns = [d[0] for d in cur.description]
+    data = [list(col) for col in zip(*rows)] if rows else [[] for _ in columns]
+    return {"columns": columns, "data": data}
+
+
+def rows_response(rows: list[dict]) -> Any:
+    """
+    Listas vindas direto do SQLite (tipos já batem com as colunas): serializa sem
+    revalidar cada linha no response_model, que segue valendo para o schema do OpenAPI.
+    """
+    return _DefaultResponse(rows)
+
+
+# Cache de respostas (resumos/gráficos/fatura): chave = rota + parâmetros + versão dos dados.
+# A versão (tabela data_version) é incrementada por triggers em toda escrita, então qualquer
+# processo/réplica invalida o cache só por ler 1 linha; o ETag deixa o browser receber 304.
+_RESP_CACHE_MAX = 1024
+_RESP_CACHE: "OrderedDict[tuple, bytes]" = OrderedDict()
+_RESP_CACHE_LOCK = threading.Lock()
+
+
+def data_version(conn: Any) -> int:
+    try:
+        r = conn.execute("SELECT v FROM data_version WHERE id=1").fetchone()
+        return int(r[0]) if r else 0
+    except Exception:
+        return -1
+
+
+def cached_response(request: Request, conn: Any, key: tuple, compute: Callable[[], Any]) -> Response:
+    ver = data_version(conn)
+    if ver < 0:
+        return rows_response(compute())
+
+    full_key = (*key, ver)
+    etag = '"' + hashlib.blake2b(repr(full_key).encode("utf-8"), digest_size=12).hexdigest() + '"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    with _RESP_CACHE_LOCK:
+        body = _RESP_CACHE.get(full_key)
+        if body is not None:
+            _RESP_CACHE.move_to_end(full_key)
+    if body is None:
+        body = rows_response(compute()).body
+        with _RESP_CACHE_LOCK:
+            _RESP_CACHE[full_key] = body
+            while len(_RESP_CACHE) > _RESP_CACHE_MAX:
+                _RESP_CACHE.popitem(last=False)
+
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+# Mesmo esquema para valores Python (séries de histórico do forecast): chave + versão dos
+# dados. O valor devolvido é compartilhado entre requests — tratar como somente leitura.
+_VALUE_CACHE_MAX = 64
+_VALUE_CACHE: "OrderedDict[tuple, Any]" = OrderedDict()
+_VALUE_CACHE_LOCK = threading.Lock()
+
+
+def cached_value(conn: Any, key: tuple, compute: Callable[[], Any]) -> Any:
+    ver = data_version(conn)
+    if ver < 0:
+        return compute()
+
+    full_key = (*key, ver)
+    with _VALUE_CACHE_LOCK:
+        if full_key in _VALUE_CACHE:
+            _VALUE_CACHE.move_to_end(full_key)
+            return _VALUE_CACHE[full_key]
+    value = compute()
+    with _VALUE_CACHE_LOCK:
+        _VALUE_CACHE[full_key] = value
+        while len(_VALUE_CACHE) > _VALUE_CACHE_MAX:
+            _VALUE_CACHE.popitem(last=False)
+    return value
+
+
 def q_one(conn: Any, sql: str, params: tuple = ()) -> Optional[dict]:
     cur = conn.execute(sql, params)
     row = cur.fetchone()
@@ -233,10 +442,51 @@ def q_one(conn: Any, sql: str, params: tuple = ()) -> Optional[dict]:
 
 
 def q_scalar(conn: Any, sql: str, params: tuple = (), default: float = 0.0) -> float:
-    r = q_one(conn, sql, params)
+    r = conn.execute(sql, params).fetchone()
     if not r:
         return float(default)
-    return float(next(iter(r.values())) or default)
+    return float(r[0] or default)
+
+
+def _begin_write(conn: Any) -> None:
+    """
+    Abre a transação já com o lock de escrita (BEGIN IMMEDIATE): leitura + escritas
+    dependentes viram uma unidade atômica, com um único commit/fsync no WAL.
+    """
+    if getattr(conn, "in_transaction", False):
+        return
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+    except sqlite3.OperationalError as e:
+        # lock não obtido dentro do busy_timeout: seguir sem ele quebraria a atomicidade
+        raise HTTPException(
+            status_code=503, detail="Banco ocupado. Tente novamente.", headers={"Retry-After": "1"}
+        ) from e
+    except Exception:
+        # libSQL pode não aceitar BEGIN IMMEDIATE: lá segue na transação implícita
+        if not USE_TURSO:
+            raise
+
+
+# INSERT ... RETURNING (SQLite >= 3.35; libSQL já suporta): a linha criada volta no próprio
+# INSERT, sem o SELECT por id depois
+_HAS_RETURNING = USE_TURSO or sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+def _insert_returning(conn: Any, table: str, sql: str, params: tuple) -> Optional[dict]:
+    """Executa o INSERT, commita e devolve a linha inserida (SELECT * equivalente)."""
+    if _HAS_RETURNING:
+        cur = conn.execute(sql + " RETURNING *", params)
+        rows = cur.fetchall()  # esgota o statement antes do commit
+        conn.commit()
+        _maybe_sync(conn)
+        return _row_to_dict(cur, rows[0]) if rows else None
+
+    cur = conn.execute(sql, params)
+    conn.commit()
+    _maybe_sync(conn)
+    new_id = _lastrowid(cur, conn)
+    return q_one(conn, f"SELECT * FROM {table} WHERE id = ?", (new_id,))
 
 
 def _lastrowid(cur: Any, conn: Any) -> int:
@@ -308,7 +558,10 @@ def init_db() -> None:
         );
         """)
 
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_tx_date ON transactions(date);")
+        # índice de cobertura dos agregados por mês (range em date + type/category/amount):
+        # resumos e gráficos são respondidos só pelo índice. Substitui idx_tx_date (prefixo dele).
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tx_date_type_cat ON transactions(date, type, category, amount);")
+        conn.execute("DROP INDEX IF EXISTS idx_tx_date;")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_tx_account ON transactions(account_id);")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_tx_cat ON transactions(category);")
 
@@ -343,6 +596,34 @@ def init_db() -> None:
         conn.execute("CREATE INDEX IF NOT EXISTS idx_card_purchases_invoice ON card_purchases(card_id, invoice_ym);")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_card_purchases_date ON card_purchases(purchase_date);")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_card_purchases_cat ON card_purchases(category);")
+        # filtros por competência (resumos/gráficos/fatura): o índice (card_id, invoice_ym) não serve
+        # para invoice_ym sozinho; com card_id/status/amount/purchase_date/category os totais e os
+        # agrupamentos por dia/categoria dos gráficos combinados saem só do índice
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_card_purchases_ym_cover "
+            "ON card_purchases(invoice_ym, card_id, status, amount, purchase_date, category);"
+        )
+        conn.execute("DROP INDEX IF EXISTS idx_card_purchases_ym_card;")
+        # agrupamentos dos gráficos por competência: já ordenados pela chave do GROUP BY,
+        # o SQLite agrega em streaming direto do índice (sem B-tree temporária)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_card_purchases_ym_cat ON card_purchases(invoice_ym, category, amount);")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_card_purchases_ym_date ON card_purchases(invoice_ym, purchase_date, amount);")
+
+        # versão dos dados para o cache de respostas: qualquer escrita em lançamentos,
+        # compras ou cartões incrementa (inclusive deletes em cascata)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS data_version (
+          id INTEGER PRIMARY KEY CHECK(id = 1),
+          v INTEGER NOT NULL
+        );
+        """)
+        conn.execute("INSERT OR IGNORE INTO data_version(id, v) VALUES (1, 0);")
+        for table in ("transactions", "card_purchases", "credit_cards"):
+            for op in ("INSERT", "UPDATE", "DELETE"):
+                conn.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{op.lower()}_version AFTER {op} ON {table} "
+                    "BEGIN UPDATE data_version SET v = v + 1 WHERE id = 1; END;"
+                )
 
         conn.execute("""
         CREATE TABLE IF NOT EXISTS ml_models (
@@ -352,6 +633,11 @@ def init_db() -> None:
         );
         """)
 
+        # estatísticas (sqlite_stat1) para o planner escolher entre os índices compostos;
+        # só na primeira vez — depois o PRAGMA optimize do close_pool mantém atualizado
+        if not USE_TURSO and not q_one(conn, "SELECT 1 AS x FROM sqlite_master WHERE name='sqlite_stat1'"):
+            conn.execute("ANALYZE;")
+
         conn.commit()
         _maybe_sync(conn)
 
@@ -377,11 +663,11 @@ def seed_defaults() -> None:
                 CATEGORY_CARD_BUCKET,
                 CATEGORY_CARD_PAYMENT,
             ]
-            for n in base:
-                conn.execute(
-                    "INSERT OR IGNORE INTO categories(name, created_at) VALUES (?,?)",
-                    (n, now_iso()),
-                )
+            ts = now_iso()
+            conn.executemany(
+                "INSERT OR IGNORE INTO categories(name, created_at) VALUES (?,?)",
+                [(n, ts) for n in base],
+            )
 
         conn.commit()
         _maybe_sync(conn)
@@ -394,13 +680,24 @@ def seed_defaults() -> None:
 async def lifespan(app: FastAPI):
     init_db()
     seed_defaults()
+    if GROQ_API_KEY:
+        _groq_client()
+    start_ai_workers()
     yield
+    await stop_ai_workers()
+    await close_groq_client()
+    close_pool()
 
 
 # ============================================================
 # App + CORS (ordem correta)
 # ============================================================
-app = FastAPI(title="FinanceAI API", version="1.7.1", lifespan=lifespan)
+app = FastAPI(
+    title="FinanceAI API",
+    version="1.7.1",
+    lifespan=lifespan,
+    default_response_class=_DefaultResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -410,12 +707,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip para respostas > 1 KB (CSV/relatórios/gráficos); o CSV em streaming é
+# comprimido bloco a bloco, sem bufferizar o arquivo inteiro. SSE fica de fora:
+# o zlib seguraria os tokens pequenos até juntar um bloco.
+_NO_GZIP_PATHS = {"/ai/stream"}
+
+
+class _GZipExceptSSE(GZipMiddleware):
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http" and scope["path"] in _NO_GZIP_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+app.add_middleware(_GZipExceptSSE, minimum_size=1024)
+
 print("[CORS] origins =", origins, "| allow_credentials =", allow_credentials)
 
 # ============================================================
 # Pydantic
 # ============================================================
+# Payloads de entrada são só lidos pelas rotas: imutáveis. O validador (pydantic-core)
+# de cada modelo é compilado uma vez na criação da classe e reaproveitado pelo FastAPI.
+_IN_CONFIG = ConfigDict(frozen=True)
+
+
 class AccountIn(BaseModel):
+    model_config = _IN_CONFIG
+
     name: str = Field(min_length=1)
     bank: str = Field(min_length=1)
     type: str = Field(min_length=1)
@@ -427,6 +747,8 @@ class AccountOut(AccountIn):
 
 
 class CategoryIn(BaseModel):
+    model_config = _IN_CONFIG
+
     name: str = Field(min_length=1)
 
 
@@ -436,6 +758,8 @@ class CategoryOut(CategoryIn):
 
 
 class TransactionIn(BaseModel):
+    model_config = _IN_CONFIG
+
     type: TxType
     amount: float = Field(ge=0)
     description: str = Field(min_length=1)
@@ -471,6 +795,8 @@ class CombinedSummaryOut(BaseModel):
 
 
 class AIRequest(BaseModel):
+    model_config = _IN_CONFIG
+
     question: str = Field(min_length=1)
     context: Dict[str, Any] = Field(default_factory=dict)
 
@@ -479,7 +805,19 @@ class AIResponse(BaseModel):
     answer_md: str
 
 
+AIJobStatus = Literal["queued", "running", "done", "error"]
+
+
+class AIJobOut(BaseModel):
+    id: str
+    status: AIJobStatus
+    answer_md: Optional[str] = None
+    error: Optional[str] = None
+
+
 class CreditCardIn(BaseModel):
+    model_config = _IN_CONFIG
+
     name: str = Field(min_length=1)
     bank: str = Field(min_length=1)
     closing_day: int = Field(ge=1, le=31)
@@ -493,6 +831,8 @@ class CreditCardOut(CreditCardIn):
 
 
 class CardPurchaseIn(BaseModel):
+    model_config = _IN_CONFIG
+
     card_id: int
     amount: float = Field(ge=0)
     description: str = Field(min_length=1)
@@ -509,6 +849,8 @@ class CardPurchaseOut(CardPurchaseIn):
 
 
 class CardPurchasePatch(BaseModel):
+    model_config = _IN_CONFIG
+
     status: PurchaseStatus
 
 
@@ -522,8 +864,10 @@ class InvoiceSummaryOut(BaseModel):
 
 
 class PayInvoiceIn(BaseModel):
+    model_config = _IN_CONFIG
+
     card_id: int
-    invoice_ym: str = Field(min_length=7, max_length=7)  # YYYY-MM
+    invoice_ym: str = Field(pattern=YM_PATTERN)  # YYYY-MM
     pay_date: str = Field(min_length=10, max_length=10)  # YYYY-MM-DD
     account_id: int
 
@@ -572,18 +916,28 @@ class ForecastOut(BaseModel):
 # ============================================================
 # Helpers: datas/competência
 # ============================================================
+_DATE_RE = re.compile(r"([0-9]{4})-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])")
+
+
 def parse_date_yyyy_mm_dd(date_str: str) -> None:
-    try:
-        datetime.strptime(date_str, "%Y-%m-%d")
-    except ValueError:
+    # regex compilada para o formato + dias do mês (bissexto incluso): mesmo resultado do
+    # strptime("%Y-%m-%d"), sem montar struct_time a cada validação
+    m = _DATE_RE.fullmatch(date_str)
+    if m is None:
+        raise HTTPException(status_code=422, detail="date inválida. Use YYYY-MM-DD.")
+    y, mo, d = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    if y < 1 or d > calendar.monthrange(y, mo)[1]:
         raise HTTPException(status_code=422, detail="date inválida. Use YYYY-MM-DD.")
 
 
-def parse_ym(ym: str) -> None:
-    try:
-        datetime.strptime(ym, "%Y-%m")
-    except ValueError:
-        raise HTTPException(status_code=422, detail="valor inválido. Use YYYY-MM.")
+@lru_cache(maxsize=4096)
+def ym_bounds(ym: str) -> tuple[str, str]:
+    """
+    Intervalo [ym, ym') equivalente a substr(date,1,7)=ym, com ym' = ym com o último
+    dígito +1 ("2025-01" -> "2025-02", "2025-12" -> "2025-13"). Comparação de texto
+    pura: o índice de date faz range scan em vez de avaliar substr em toda linha.
+    """
+    return ym, ym[:-1] + chr(ord(ym[-1]) + 1)
 
 
 def add_months(year: int, month: int, delta: int) -> tuple[int, int]:
@@ -594,9 +948,9 @@ def add_months(year: int, month: int, delta: int) -> tuple[int, int]:
 
 
 def compute_invoice_ym(purchase_date: str, closing_day: int) -> str:
-    dt = datetime.strptime(purchase_date, "%Y-%m-%d")
-    y, m = dt.year, dt.month
-    if dt.day > int(closing_day):
+    # purchase_date já validada (YYYY-MM-DD): fatiar basta
+    y, m, d = int(purchase_date[0:4]), int(purchase_date[5:7]), int(purchase_date[8:10])
+    if d > int(closing_day):
         y, m = add_months(y, m, 1)
     return f"{y:04d}-{m:02d}"
 
@@ -604,7 +958,26 @@ def compute_invoice_ym(purchase_date: str, closing_day: int) -> str:
 # ============================================================
 # Persistência de modelos (ml_models)
 # ============================================================
+# Payloads decodificados em memória, chave (name, trained_at): o SELECT de trained_at é
+# barato e evita json.loads do payload (com os modelos em base64) a cada request.
+# O dict devolvido é compartilhado — tratar como somente leitura.
+_MODEL_CACHE_MAX = 32
+_MODEL_CACHE: "OrderedDict[tuple[str, str], dict]" = OrderedDict()
+_MODEL_CACHE_LOCK = threading.Lock()
+
+
+def _model_cache_put(key: tuple[str, str], payload: dict) -> None:
+    with _MODEL_CACHE_LOCK:
+        # trained_at tem resolução de segundos: descarta versões antigas do mesmo nome
+        for k in [k for k in _MODEL_CACHE if k[0] == key[0]]:
+            del _MODEL_CACHE[k]
+        _MODEL_CACHE[key] = payload
+        while len(_MODEL_CACHE) > _MODEL_CACHE_MAX:
+            _MODEL_CACHE.popitem(last=False)
+
+
 def save_model(conn: Any, name: str, payload: dict) -> None:
+    trained_at = payload.get("trained_at") or now_iso()
     conn.execute(
         """
         INSERT INTO ml_models(name, trained_at, payload_json)
@@ -613,43 +986,93 @@ def save_model(conn: Any, name: str, payload: dict) -> None:
           trained_at=excluded.trained_at,
           payload_json=excluded.payload_json
         """,
-        (name, payload.get("trained_at", now_iso()), json.dumps(payload, ensure_ascii=False)),
+        (name, trained_at, json.dumps(payload, ensure_ascii=False)),
     )
     conn.commit()
     _maybe_sync(conn)
+    _model_cache_put((name, trained_at), payload)
+
+
+def model_trained_at(conn: Any, name: str) -> Optional[str]:
+    row = conn.execute("SELECT trained_at FROM ml_models WHERE name=?", (name,)).fetchone()
+    return row[0] if row else None
 
 
 def load_model(conn: Any, name: str) -> Optional[dict]:
+    trained_at = model_trained_at(conn, name)
+    if trained_at is None:
+        return None
+
+    key = (name, trained_at)
+    with _MODEL_CACHE_LOCK:
+        if key in _MODEL_CACHE:
+            _MODEL_CACHE.move_to_end(key)
+            return _MODEL_CACHE[key]
+
     row = q_one(conn, "SELECT payload_json FROM ml_models WHERE name=?", (name,))
     if not row:
         return None
     try:
-        return json.loads(row["payload_json"])
+        payload = json.loads(row["payload_json"])
     except Exception:
         return None
+    _model_cache_put(key, payload)
+    return payload
+
+
+# A previsão servida pelos GETs de forecast é função do modelo (name, trained_at) e dos
+# parâmetros: dá para responder 304 só com o SELECT de trained_at, sem carregar o modelo.
+_FORECAST_CACHE_CONTROL = "private, max-age=60"
+
+
+def forecast_etag(name: str, trained_at: str, *params: Any) -> str:
+    raw = repr((name, trained_at, *params)).encode("utf-8")
+    return 'W/"' + hashlib.blake2b(raw, digest_size=12).hexdigest() + '"'
+
+
+def forecast_not_modified(request: Request, etag: Optional[str]) -> Optional[Response]:
+    if etag and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": _FORECAST_CACHE_CONTROL})
+    return None
+
+
+def set_forecast_etag(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = _FORECAST_CACHE_CONTROL
 
 
 # ============================================================
 # Health
 # ============================================================
+# Rotas sem I/O: async def roda direto no event loop, sem passar pelo threadpool
 @app.get("/")
-def root():
+async def root():
     return {"name": "FinanceAI API", "version": "1.7.1", "ok": True}
 
 
+# parte fixa do /health montada uma vez (só "ts" muda por request; a chave já existe
+# aqui para manter a ordem do JSON)
+_HEALTH_BASE = {
+    "ok": True,
+    "db_mode": "turso" if USE_TURSO else "sqlite",
+    "db_path": DB_PATH,
+    "turso_url_set": bool(TURSO_DATABASE_URL),
+    "turso_sync_interval": TURSO_SYNC_INTERVAL,
+    "groq_model": GROQ_MODEL,
+    "cors_origins": origins,
+    "ts": None,
+    "card_payment_category": CATEGORY_CARD_PAYMENT,
+}
+
+
 @app.get("/health")
-def health():
-    return {
-        "ok": True,
-        "db_mode": "turso" if USE_TURSO else "sqlite",
-        "db_path": DB_PATH,
-        "turso_url_set": bool(TURSO_DATABASE_URL),
-        "turso_sync_interval": TURSO_SYNC_INTERVAL,
-        "groq_model": GROQ_MODEL,
-        "cors_origins": origins,
-        "ts": now_iso(),
-        "card_payment_category": CATEGORY_CARD_PAYMENT,
-    }
+async def health():
+    return _DefaultResponse({**_HEALTH_BASE, "ts": now_iso()}, headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/health/pool")
+async def health_pool():
+    return pool_stats()
 
 
 # ============================================================
@@ -658,20 +1081,18 @@ def health():
 @app.get("/accounts", response_model=list[AccountOut])
 def list_accounts():
     with db() as conn:
-        return q_all(conn, "SELECT * FROM accounts ORDER BY id DESC")
+        return rows_response(q_all(conn, "SELECT * FROM accounts ORDER BY id DESC"))
 
 
 @app.post("/accounts", response_model=AccountOut)
 def create_account(payload: AccountIn):
     with db() as conn:
-        cur = conn.execute(
+        row = _insert_returning(
+            conn,
+            "accounts",
             "INSERT INTO accounts(name, bank, type, created_at) VALUES (?,?,?,?)",
             (payload.name, payload.bank, payload.type, now_iso()),
         )
-        conn.commit()
-        _maybe_sync(conn)
-        new_id = _lastrowid(cur, conn)
-        row = q_one(conn, "SELECT * FROM accounts WHERE id = ?", (new_id,))
         return row  # type: ignore[return-value]
 
 
@@ -692,7 +1113,7 @@ def delete_account(account_id: int):
 @app.get("/categories", response_model=list[CategoryOut])
 def list_categories():
     with db() as conn:
-        return q_all(conn, "SELECT * FROM categories ORDER BY name ASC")
+        return rows_response(q_all(conn, "SELECT * FROM categories ORDER BY name ASC"))
 
 
 @app.post("/categories", response_model=CategoryOut)
@@ -701,19 +1122,17 @@ def create_category(payload: CategoryIn):
         raise HTTPException(status_code=422, detail="Nome de categoria inválido.")
     with db() as conn:
         try:
-            cur = conn.execute(
+            row = _insert_returning(
+                conn,
+                "categories",
                 "INSERT INTO categories(name, created_at) VALUES (?,?)",
                 (payload.name, now_iso()),
             )
-            conn.commit()
-            _maybe_sync(conn)
         except Exception as e:
             msg = str(e).lower()
             if "unique" in msg:
                 raise HTTPException(status_code=409, detail="Categoria já existe.")
             raise
-        new_id = _lastrowid(cur, conn)
-        row = q_one(conn, "SELECT * FROM categories WHERE id = ?", (new_id,))
         return row  # type: ignore[return-value]
 
 
@@ -737,20 +1156,20 @@ def delete_category(category_id: int):
 # Transactions (Caixa)
 # ============================================================
 @app.get("/transactions", response_model=list[TransactionOut])
-def list_transactions(year: Optional[int] = None, month: Optional[int] = None, limit: int = 200):
-    if limit < 1 or limit > 2000:
-        raise HTTPException(status_code=422, detail="limit deve estar entre 1 e 2000.")
+def list_transactions(
+    year: Optional[int] = None,
+    month: Optional[Month] = None,
+    limit: Annotated[int, Query(ge=1, le=2000)] = 200,
+):
     with db() as conn:
         if year is not None and month is not None:
-            if month < 1 or month > 12:
-                raise HTTPException(status_code=422, detail="month deve estar entre 1 e 12.")
             ym = f"{year:04d}-{month:02d}"
-            return q_all(
+            return rows_response(q_all(
                 conn,
-                "SELECT * FROM transactions WHERE substr(date,1,7)=? ORDER BY date DESC, id DESC LIMIT ?",
-                (ym, limit),
-            )
-        return q_all(conn, "SELECT * FROM transactions ORDER BY date DESC, id DESC LIMIT ?", (limit,))
+                "SELECT * FROM transactions WHERE date >= ? AND date < ? ORDER BY date DESC, id DESC LIMIT ?",
+                (*ym_bounds(ym), limit),
+            ))
+        return rows_response(q_all(conn, "SELECT * FROM transactions ORDER BY date DESC, id DESC LIMIT ?", (limit,)))
 
 
 @app.post("/transactions", response_model=TransactionOut)
@@ -760,7 +1179,9 @@ def create_transaction(payload: TransactionIn):
         acc = q_one(conn, "SELECT id FROM accounts WHERE id=?", (payload.account_id,))
         if not acc:
             raise HTTPException(status_code=400, detail="account_id inválido.")
-        cur = conn.execute(
+        row = _insert_returning(
+            conn,
+            "transactions",
             """
             INSERT INTO transactions(type, amount, description, date, account_id, category, created_at)
             VALUES (?,?,?,?,?,?,?)
@@ -775,10 +1196,6 @@ def create_transaction(payload: TransactionIn):
                 now_iso(),
             ),
         )
-        conn.commit()
-        _maybe_sync(conn)
-        new_id = _lastrowid(cur, conn)
-        row = q_one(conn, "SELECT * FROM transactions WHERE id = ?", (new_id,))
         return row  # type: ignore[return-value]
 
 
@@ -799,222 +1216,184 @@ def delete_transaction(tx_id: int):
 @app.get("/transactions/combined")
 def list_transactions_combined(
     year: int,
-    month: int,
-    limit: int = 5000,
+    month: Month,
+    limit: Annotated[int, Query(ge=1, le=20000)] = 5000,
     include_card_payments: bool = False,
 ):
-    if month < 1 or month > 12:
-        raise HTTPException(status_code=422, detail="month deve estar entre 1 e 12.")
-    if limit < 1 or limit > 20000:
-        raise HTTPException(status_code=422, detail="limit deve estar entre 1 e 20000.")
-
     ym = f"{year:04d}-{month:02d}"
+    ym_lo, ym_hi = ym_bounds(ym)
+
+    # pagamento de fatura fica de fora (a menos que pedido): a despesa real já está no cartão
+    cash_filter = "" if include_card_payments else " AND NOT (type='expense' AND category=?)"
+    params: list[Any] = [ym_lo, ym_hi]
+    if not include_card_payments:
+        params.append(CATEGORY_CARD_PAYMENT)
+    params += [limit, ym, limit, limit]
 
     with db() as conn:
-        if include_card_payments:
-            tx = q_all(
-                conn,
-                """
-                SELECT id, type, amount, description, date, account_id, category, created_at
+        # caixa + cartão numa consulta só: cada perna já vem limitada e o SQLite faz o
+        # merge/ORDER BY/LIMIT; em empate de (date, id) o caixa vem antes (leg)
+        cur = conn.execute(
+            f"""
+            SELECT source, id, type, amount, description, date, category, account_id,
+                   card_id, invoice_ym, status, paid_at, created_at
+            FROM (
+              SELECT * FROM (
+                SELECT 'cash' AS source, id, type, amount, COALESCE(description, '') AS description,
+                       date, COALESCE(category, '') AS category, account_id,
+                       NULL AS card_id, NULL AS invoice_ym, NULL AS status, NULL AS paid_at,
+                       created_at, 0 AS leg
                 FROM transactions
-                WHERE substr(date,1,7)=?
+                WHERE date >= ? AND date < ?{cash_filter}
                 ORDER BY date DESC, id DESC
                 LIMIT ?
-                """,
-                (ym, limit),
-            )
-        else:
-            tx = q_all(
-                conn,
-                """
-                SELECT id, type, amount, description, date, account_id, category, created_at
-                FROM transactions
-                WHERE substr(date,1,7)=?
-                  AND NOT (type='expense' AND category=?)
-                ORDER BY date DESC, id DESC
+              )
+              UNION ALL
+              SELECT * FROM (
+                SELECT 'card', id, 'expense', amount, COALESCE(description, ''),
+                       purchase_date, COALESCE(category, ''), NULL,
+                       card_id, invoice_ym, status, paid_at,
+                       created_at, 1
+                FROM card_purchases
+                WHERE invoice_ym=?
+                ORDER BY purchase_date DESC, id DESC
                 LIMIT ?
-                """,
-                (ym, CATEGORY_CARD_PAYMENT, limit),
+              )
             )
-
-        cp = q_all(
-            conn,
-            """
-            SELECT id, card_id, amount, description, category, purchase_date, invoice_ym, status, paid_at, created_at
-            FROM card_purchases
-            WHERE invoice_ym=?
-            ORDER BY purchase_date DESC, id DESC
+            ORDER BY date DESC, id DESC, leg ASC
             LIMIT ?
             """,
-            (ym, limit),
+            tuple(params),
         )
+        rows = cur.fetchall()
+        cols = [d[0] for d in cur.description]
 
-        combined: list[dict] = []
-
-        for t in tx:
-            combined.append(
-                {
-                    "source": "cash",
-                    "id": t.get("id"),
-                    "type": t.get("type"),
-                    "amount": float(t.get("amount") or 0.0),
-                    "description": t.get("description") or "",
-                    "date": t.get("date"),
-                    "category": t.get("category") or "",
-                    "account_id": t.get("account_id"),
-                    "created_at": t.get("created_at"),
-                }
-            )
-
-        for p in cp:
-            combined.append(
-                {
-                    "source": "card",
-                    "id": p.get("id"),
-                    "type": "expense",
-                    "amount": float(p.get("amount") or 0.0),
-                    "description": p.get("description") or "",
-                    "date": p.get("purchase_date"),
-                    "category": p.get("category") or "",
-                    "account_id": None,
-                    "card_id": p.get("card_id"),
-                    "invoice_ym": p.get("invoice_ym"),
-                    "status": p.get("status"),
-                    "paid_at": p.get("paid_at"),
-                    "created_at": p.get("created_at"),
-                }
-            )
-
-        combined.sort(key=lambda r: (str(r.get("date") or ""), int(r.get("id") or 0)), reverse=True)
-        return combined[:limit]
+    # linhas do caixa não têm os campos do cartão (colunas 8..11: card_id..paid_at):
+    # cada perna monta o dict direto com a sua lista de colunas
+    cash_cols = cols[:8] + cols[12:]
+    return rows_response([
+        dict(zip(cash_cols, r[:8] + r[12:])) if r[0] == "cash" else dict(zip(cols, r))
+        for r in rows
+    ])
 
 
 # ============================================================
 # Summary (caixa) + combinado (caixa + cartão)
 # ============================================================
 @app.get("/summary", response_model=SummaryOut)
-def get_summary(year: int, month: int, exclude_card_payments: bool = True):
-    if month < 1 or month > 12:
-        raise HTTPException(status_code=422, detail="month deve estar entre 1 e 12.")
-    ym = f"{year:04d}-{month:02d}"
+def get_summary(request: Request, year: int, month: Month, exclude_card_payments: bool = True):
     with db() as conn:
-        if exclude_card_payments:
-            row = q_one(
-                conn,
-                """
-                SELECT
-                  SUM(CASE WHEN type='income'  THEN amount ELSE 0 END) AS income,
-                  SUM(CASE WHEN type='expense' THEN amount ELSE 0 END) AS expense,
-                  COUNT(*) AS cnt
-                FROM transactions
-                WHERE substr(date,1,7)=?
-                  AND NOT (type='expense' AND category=?)
-                """,
-                (ym, CATEGORY_CARD_PAYMENT),
-            )
-        else:
-            row = q_one(
-                conn,
-                """
-                SELECT
-                  SUM(CASE WHEN type='income'  THEN amount ELSE 0 END) AS income,
-                  SUM(CASE WHEN type='expense' THEN amount ELSE 0 END) AS expense,
-                  COUNT(*) AS cnt
-                FROM transactions
-                WHERE substr(date,1,7)=?
-                """,
-                (ym,),
-            )
-
-        row = row or {"income": 0.0, "expense": 0.0, "cnt": 0}
-        income = float(row.get("income") or 0.0)
-        expense = float(row.get("expense") or 0.0)
-
-        return {
-            "year": year,
-            "month": month,
-            "income": income,
-            "expense": expense,
-            "balance": income - expense,
-            "count": int(row.get("cnt") or 0),
-        }
+        return cached_response(
+            request, conn, ("summary", year, month, exclude_card_payments),
+            lambda: _summary_data(conn, year, month, exclude_card_payments),
+        )
 
 
-@app.get("/summary/combined", response_model=CombinedSummaryOut)
-def get_summary_combined(year: int, month: int):
-    if month < 1 or month > 12:
-        raise HTTPException(status_code=422, detail="month deve estar entre 1 e 12.")
+def _summary_data(conn: Any, year: int, month: int, exclude_card_payments: bool) -> dict:
     ym = f"{year:04d}-{month:02d}"
-    with db() as conn:
-        cash = q_one(
-            conn,
+    if exclude_card_payments:
+        row = conn.execute(
             """
             SELECT
-              SUM(CASE WHEN type='income'  THEN amount ELSE 0 END) AS income,
-              SUM(CASE WHEN type='expense' THEN amount ELSE 0 END) AS expense_cash,
-              COUNT(*) AS cnt_cash
+              TOTAL(CASE WHEN type='income'  THEN amount ELSE 0 END) AS income,
+              TOTAL(CASE WHEN type='expense' THEN amount ELSE 0 END) AS expense,
+              COUNT(*) AS cnt
             FROM transactions
-            WHERE substr(date,1,7)=?
+            WHERE date >= ? AND date < ?
               AND NOT (type='expense' AND category=?)
             """,
-            (ym, CATEGORY_CARD_PAYMENT),
-        ) or {"income": 0.0, "expense_cash": 0.0, "cnt_cash": 0}
-
-        card = q_one(
-            conn,
+            (*ym_bounds(ym), CATEGORY_CARD_PAYMENT),
+        ).fetchone()
+    else:
+        row = conn.execute(
             """
             SELECT
-              SUM(amount) AS expense_card,
-              COUNT(*) AS cnt_card
-            FROM card_purchases
-            WHERE invoice_ym=?
+              TOTAL(CASE WHEN type='income'  THEN amount ELSE 0 END) AS income,
+              TOTAL(CASE WHEN type='expense' THEN amount ELSE 0 END) AS expense,
+              COUNT(*) AS cnt
+            FROM transactions
+            WHERE date >= ? AND date < ?
             """,
-            (ym,),
-        ) or {"expense_card": 0.0, "cnt_card": 0}
+            ym_bounds(ym),
+        ).fetchone()
 
-        income = float(cash.get("income") or 0.0)
-        expense_cash = float(cash.get("expense_cash") or 0.0)
-        expense_card = float(card.get("expense_card") or 0.0)
-        expense_total = expense_cash + expense_card
+    # agregado sem GROUP BY: sempre 1 linha; TOTAL() já devolve 0.0 (float) sem linhas
+    income, expense, cnt = row
 
-        return {
-            "year": year,
-            "month": month,
-            "income": income,
-            "expense_cash": expense_cash,
-            "expense_card": expense_card,
-            "expense_total": expense_total,
-            "balance": income - expense_total,
-            "count_cash": int(cash.get("cnt_cash") or 0),
-            "count_card": int(card.get("cnt_card") or 0),
-        }
+    return {
+        "year": year,
+        "month": month,
+        "income": income,
+        "expense": expense,
+        "balance": income - expense,
+        "count": cnt,
+    }
+
+
+@app.get("/summary/combined", response_model=CombinedSummaryOut)
+def get_summary_combined(request: Request, year: int, month: Month):
+    with db() as conn:
+        return cached_response(
+            request, conn, ("summary_combined", year, month),
+            lambda: _summary_combined_data(conn, year, month),
+        )
+
+
+def _summary_combined_data(conn: Any, year: int, month: int) -> dict:
+    ym = f"{year:04d}-{month:02d}"
+    # caixa e cartão num statement só (agregados sem GROUP BY: sempre 1 linha cada)
+    income, expense_cash, cnt_cash, expense_card, cnt_card = conn.execute(
+        """
+        WITH c AS (
+          SELECT
+            TOTAL(CASE WHEN type='income'  THEN amount ELSE 0 END) AS income,
+            TOTAL(CASE WHEN type='expense' THEN amount ELSE 0 END) AS expense_cash,
+            COUNT(*) AS cnt_cash
+          FROM transactions
+          WHERE date >= ? AND date < ?
+            AND NOT (type='expense' AND category=?)
+        ), k AS (
+          SELECT
+            TOTAL(amount) AS expense_card,
+            COUNT(*) AS cnt_card
+          FROM card_purchases
+          WHERE invoice_ym=?
+        )
+        SELECT c.income, c.expense_cash, c.cnt_cash, k.expense_card, k.cnt_card
+        FROM c, k
+        """,
+        (*ym_bounds(ym), CATEGORY_CARD_PAYMENT, ym),
+    ).fetchone()
+    expense_total = expense_cash + expense_card
+
+    return {
+        "year": year,
+        "month": month,
+        "income": income,
+        "expense_cash": expense_cash,
+        "expense_card": expense_card,
+        "expense_total": expense_total,
+        "balance": income - expense_total,
+        "count_cash": cnt_cash,
+        "count_card": cnt_card,
+    }
 
 
 # ============================================================
 # Charts (caixa)
 # ============================================================
 @app.get("/charts/timeseries")
-def chart_timeseries(year: int, month: int, exclude_card_payments: bool = True):
-    if month < 1 or month > 12:
-        raise HTTPException(status_code=422, detail="month deve estar entre 1 e 12.")
-    ym = f"{year:04d}-{month:02d}"
+def chart_timeseries(request: Request, year: int, month: Month, exclude_card_payments: bool = True):
     with db() as conn:
-        if exclude_card_payments:
-            return q_all(
-                conn,
-                """
-                SELECT
-                  date,
-                  SUM(CASE WHEN type='income'  THEN amount ELSE 0 END) AS income,
-                  SUM(CASE WHEN type='expense' THEN amount ELSE 0 END) AS expense
-                FROM transactions
-                WHERE substr(date,1,7)=?
-                  AND NOT (type='expense' AND category=?)
-                GROUP BY date
-                ORDER BY date ASC
-                """,
-                (ym, CATEGORY_CARD_PAYMENT),
-            )
+        return cached_response(
+            request, conn, ("timeseries", year, month, exclude_card_payments),
+            lambda: _chart_timeseries_data(conn, year, month, exclude_card_payments),
+        )
+
+
+def _chart_timeseries_data(conn: Any, year: int, month: int, exclude_card_payments: bool) -> list[dict]:
+    ym = f"{year:04d}-{month:02d}"
+    if exclude_card_payments:
         return q_all(
             conn,
             """
@@ -1023,160 +1402,152 @@ def chart_timeseries(year: int, month: int, exclude_card_payments: bool = True):
               SUM(CASE WHEN type='income'  THEN amount ELSE 0 END) AS income,
               SUM(CASE WHEN type='expense' THEN amount ELSE 0 END) AS expense
             FROM transactions
-            WHERE substr(date,1,7)=?
+            WHERE date >= ? AND date < ?
+              AND NOT (type='expense' AND category=?)
             GROUP BY date
             ORDER BY date ASC
             """,
-            (ym,),
+            (*ym_bounds(ym), CATEGORY_CARD_PAYMENT),
         )
+    return q_all(
+        conn,
+        """
+        SELECT
+          date,
+          SUM(CASE WHEN type='income'  THEN amount ELSE 0 END) AS income,
+          SUM(CASE WHEN type='expense' THEN amount ELSE 0 END) AS expense
+        FROM transactions
+        WHERE date >= ? AND date < ?
+        GROUP BY date
+        ORDER BY date ASC
+        """,
+        ym_bounds(ym),
+    )
 
 
 @app.get("/charts/categories")
-def chart_categories(year: int, month: int, tx_type: TxType = "expense", exclude_card_payments: bool = True):
-    if month < 1 or month > 12:
-        raise HTTPException(status_code=422, detail="month deve estar entre 1 e 12.")
+def chart_categories(
+    request: Request,
+    year: int,
+    month: Month,
+    tx_type: TxType = "expense",
+    exclude_card_payments: bool = True,
+):
+    with db() as conn:
+        return cached_response(
+            request, conn, ("categories", year, month, tx_type, exclude_card_payments),
+            lambda: _chart_categories_data(conn, year, month, tx_type, exclude_card_payments),
+        )
+
+
+def _chart_categories_data(conn: Any, year: int, month: int, tx_type: str, exclude_card_payments: bool) -> list[dict]:
     if tx_type not in ("income", "expense"):
         raise HTTPException(status_code=422, detail="tx_type deve ser 'income' ou 'expense'.")
     ym = f"{year:04d}-{month:02d}"
-    with db() as conn:
-        if tx_type == "expense" and exclude_card_payments:
-            return q_all(
-                conn,
-                """
-                SELECT category, SUM(amount) AS total
-                FROM transactions
-                WHERE substr(date,1,7)=?
-                  AND type='expense'
-                  AND NOT (type='expense' AND category=?)
-                GROUP BY category
-                ORDER BY total DESC
-                """,
-                (ym, CATEGORY_CARD_PAYMENT),
-            )
+    if tx_type == "expense" and exclude_card_payments:
         return q_all(
             conn,
             """
             SELECT category, SUM(amount) AS total
             FROM transactions
-            WHERE substr(date,1,7)=?
-              AND type=?
+            WHERE date >= ? AND date < ?
+              AND type='expense'
+              AND NOT (type='expense' AND category=?)
             GROUP BY category
             ORDER BY total DESC
             """,
-            (ym, tx_type),
+            (*ym_bounds(ym), CATEGORY_CARD_PAYMENT),
         )
+    return q_all(
+        conn,
+        """
+        SELECT category, SUM(amount) AS total
+        FROM transactions
+        WHERE date >= ? AND date < ?
+          AND type=?
+        GROUP BY category
+        ORDER BY total DESC
+        """,
+        (*ym_bounds(ym), tx_type),
+    )
 
 
 # ============================================================
 # Charts (combined)
 # ============================================================
 @app.get("/charts/combined/timeseries")
-def chart_combined_timeseries(year: int, month: int):
-    if month < 1 or month > 12:
-        raise HTTPException(status_code=422, detail="month deve estar entre 1 e 12.")
-    ym = f"{year:04d}-{month:02d}"
-
+def chart_combined_timeseries(request: Request, year: int, month: Month):
     with db() as conn:
-        cash_inc = q_all(
-            conn,
-            """
-            SELECT date, SUM(amount) AS income
-            FROM transactions
-            WHERE substr(date,1,7)=? AND type='income'
-            GROUP BY date
-            """,
-            (ym,),
-        )
-        cash_exp = q_all(
-            conn,
-            """
-            SELECT date, SUM(amount) AS expense_cash
-            FROM transactions
-            WHERE substr(date,1,7)=?
-              AND type='expense'
-              AND category<>?
-            GROUP BY date
-            """,
-            (ym, CATEGORY_CARD_PAYMENT),
+        return cached_response(
+            request, conn, ("combined_timeseries", year, month),
+            lambda: _chart_combined_timeseries_data(conn, year, month),
         )
 
-        card_exp = q_all(
-            conn,
-            """
-            SELECT purchase_date AS date, SUM(amount) AS expense_card
-            FROM card_purchases
-            WHERE invoice_ym=?
-            GROUP BY purchase_date
-            """,
-            (ym,),
-        )
-
-        m: dict[str, dict[str, float]] = {}
-
-        for r in cash_inc:
-            d = str(r.get("date"))
-            m.setdefault(d, {"income": 0.0, "expense_total": 0.0})
-            m[d]["income"] += float(r.get("income") or 0.0)
 
-        for r in cash_exp:
-            d = str(r.get("date"))
-            m.setdefault(d, {"income": 0.0, "expense_total": 0.0})
-            m[d]["expense_total"] += float(r.get("expense_cash") or 0.0)
-
-        for r in card_exp:
-            d = str(r.get("date"))
-            m.setdefault(d, {"income": 0.0, "expense_total": 0.0})
-            m[d]["expense_total"] += float(r.get("expense_card") or 0.0)
-
-        out = [{"date": k, "income": v["income"], "expense_total": v["expense_total"]} for k, v in m.items()]
-        out.sort(key=lambda x: str(x.get("date") or ""))
-        return out
+def _chart_combined_timeseries_data(conn: Any, year: int, month: int) -> list[dict]:
+    ym = f"{year:04d}-{month:02d}"
+    # caixa (por dia, já agregado no índice) + cartão (por dia de compra) numa consulta:
+    # cada data tem no máximo uma linha de cada perna, então o GROUP BY externo só soma 2 termos
+    return q_all(
+        conn,
+        """
+        SELECT d AS date, SUM(inc) AS income, SUM(exp) AS expense_total
+        FROM (
+          SELECT date AS d,
+                 SUM(CASE WHEN type='income' THEN amount ELSE 0.0 END) AS inc,
+                 SUM(CASE WHEN type='expense' THEN amount ELSE 0.0 END) AS exp
+          FROM transactions
+          WHERE date >= ? AND date < ?
+            AND (type='income' OR (type='expense' AND category<>?))
+          GROUP BY date
+          UNION ALL
+          SELECT purchase_date, 0.0, SUM(amount)
+          FROM card_purchases
+          WHERE invoice_ym=?
+          GROUP BY purchase_date
+        )
+        GROUP BY d
+        ORDER BY d
+        """,
+        (*ym_bounds(ym), CATEGORY_CARD_PAYMENT, ym),
+    )
 
 
 @app.get("/charts/combined/categories")
-def chart_combined_categories(year: int, month: int):
-    if month < 1 or month > 12:
-        raise HTTPException(status_code=422, detail="month deve estar entre 1 e 12.")
-    ym = f"{year:04d}-{month:02d}"
-
+def chart_combined_categories(request: Request, year: int, month: Month):
     with db() as conn:
-        cash = q_all(
-            conn,
-            """
-            SELECT category, SUM(amount) AS total
-            FROM transactions
-            WHERE substr(date,1,7)=?
-              AND type='expense'
-              AND category<>?
-            GROUP BY category
-            """,
-            (ym, CATEGORY_CARD_PAYMENT),
-        )
-
-        card = q_all(
-            conn,
-            """
-            SELECT category, SUM(amount) AS total
-            FROM card_purchases
-            WHERE invoice_ym=?
-            GROUP BY category
-            """,
-            (ym,),
+        return cached_response(
+            request, conn, ("combined_categories", year, month),
+            lambda: _chart_combined_categories_data(conn, year, month),
         )
 
-        agg: dict[str, float] = {}
-
-        for r in cash:
-            c = str(r.get("category") or "Geral")
-            agg[c] = agg.get(c, 0.0) + float(r.get("total") or 0.0)
-
-        for r in card:
-            c = str(r.get("category") or "Geral")
-            agg[c] = agg.get(c, 0.0) + float(r.get("total") or 0.0)
 
-        out = [{"category": k, "total": v} for k, v in agg.items()]
-        out.sort(key=lambda x: float(x.get("total") or 0.0), reverse=True)
-        return out
+def _chart_combined_categories_data(conn: Any, year: int, month: int) -> list[dict]:
+    ym = f"{year:04d}-{month:02d}"
+    # caixa + cartão numa consulta: cada perna já sai agrupada pelo seu índice, então o
+    # GROUP BY externo só junta ~2 linhas por categoria (categoria vazia/nula vira "Geral")
+    return q_all(
+        conn,
+        """
+        SELECT COALESCE(NULLIF(category, ''), 'Geral') AS category, TOTAL(total) AS total
+        FROM (
+          SELECT category, SUM(amount) AS total
+          FROM transactions
+          WHERE date >= ? AND date < ?
+            AND type='expense'
+            AND category<>?
+          GROUP BY category
+          UNION ALL
+          SELECT category, SUM(amount)
+          FROM card_purchases
+          WHERE invoice_ym=?
+          GROUP BY category
+        )
+        GROUP BY 1
+        ORDER BY total DESC, category ASC
+        """,
+        (*ym_bounds(ym), CATEGORY_CARD_PAYMENT, ym),
+    )
 
 
 # ============================================================
@@ -1185,23 +1556,21 @@ def chart_combined_categories(year: int, month: int):
 @app.get("/cards", response_model=list[CreditCardOut])
 def list_cards():
     with db() as conn:
-        return q_all(conn, "SELECT * FROM credit_cards ORDER BY id DESC")
+        return rows_response(q_all(conn, "SELECT * FROM credit_cards ORDER BY id DESC"))
 
 
 @app.post("/cards", response_model=CreditCardOut)
 def create_card(payload: CreditCardIn):
     with db() as conn:
-        cur = conn.execute(
+        row = _insert_returning(
+            conn,
+            "credit_cards",
             """
             INSERT INTO credit_cards(name, bank, closing_day, due_day, credit_limit, created_at)
             VALUES (?,?,?,?,?,?)
             """,
             (payload.name, payload.bank, int(payload.closing_day), int(payload.due_day), float(payload.credit_limit or 0), now_iso()),
         )
-        conn.commit()
-        _maybe_sync(conn)
-        new_id = _lastrowid(cur, conn)
-        row = q_one(conn, "SELECT * FROM credit_cards WHERE id=?", (new_id,))
         return row  # type: ignore[return-value]
 
 
@@ -1216,13 +1585,19 @@ def delete_card(card_id: int):
         return {"ok": True}
 
 
+def _ensure_card_if_empty(conn: Any, rows: list, card_id: int) -> None:
+    """
+    Listas por cartão: a existência do cartão só precisa ser conferida quando a
+    consulta volta vazia (com linhas, o cartão existe — FK com ON DELETE CASCADE).
+    """
+    if not rows and not q_one(conn, "SELECT id FROM credit_cards WHERE id=?", (card_id,)):
+        raise HTTPException(status_code=404, detail="Cartão não encontrado.")
+
+
 @app.get("/cards/{card_id}/invoices")
 def list_card_invoices(card_id: int):
     with db() as conn:
-        card = q_one(conn, "SELECT id FROM credit_cards WHERE id=?", (card_id,))
-        if not card:
-            raise HTTPException(status_code=404, detail="Cartão não encontrado.")
-        return q_all(
+        rows = q_all(
             conn,
             """
             SELECT invoice_ym, COUNT(*) AS cnt, SUM(amount) AS total,
@@ -1234,20 +1609,19 @@ def list_card_invoices(card_id: int):
             """,
             (card_id,),
         )
+        _ensure_card_if_empty(conn, rows, card_id)
+        return rows
 
 
 @app.get("/cards/{card_id}/purchases", response_model=list[CardPurchaseOut])
-def list_card_purchases(card_id: int, invoice_ym: Optional[str] = None, limit: int = 500):
-    if limit < 1 or limit > 5000:
-        raise HTTPException(status_code=422, detail="limit deve estar entre 1 e 5000.")
-    if invoice_ym:
-        parse_ym(invoice_ym)
+def list_card_purchases(
+    card_id: int,
+    invoice_ym: Optional[YearMonth] = None,
+    limit: Annotated[int, Query(ge=1, le=5000)] = 500,
+):
     with db() as conn:
-        card = q_one(conn, "SELECT id FROM credit_cards WHERE id=?", (card_id,))
-        if not card:
-            raise HTTPException(status_code=404, detail="Cartão não encontrado.")
         if invoice_ym:
-            return q_all(
+            rows = q_all(
                 conn,
                 """
                 SELECT * FROM card_purchases
@@ -1257,37 +1631,38 @@ def list_card_purchases(card_id: int, invoice_ym: Optional[str] = None, limit: i
                 """,
                 (card_id, invoice_ym, limit),
             )
-        return q_all(
-            conn,
-            """
-            SELECT * FROM card_purchases
-            WHERE card_id=?
-            ORDER BY purchase_date DESC, id DESC
-            LIMIT ?
-            """,
-            (card_id, limit),
-        )
+        else:
+            rows = q_all(
+                conn,
+                """
+                SELECT * FROM card_purchases
+                WHERE card_id=?
+                ORDER BY purchase_date DESC, id DESC
+                LIMIT ?
+                """,
+                (card_id, limit),
+            )
+        _ensure_card_if_empty(conn, rows, card_id)
+        return rows_response(rows)
 
 
 @app.post("/cards/purchases", response_model=CardPurchaseOut)
 def create_card_purchase(payload: CardPurchaseIn):
     parse_date_yyyy_mm_dd(payload.purchase_date)
     with db() as conn:
-        card = q_one(conn, "SELECT * FROM credit_cards WHERE id=?", (payload.card_id,))
+        card = q_one(conn, "SELECT closing_day FROM credit_cards WHERE id=?", (payload.card_id,))
         if not card:
             raise HTTPException(status_code=400, detail="card_id inválido.")
         inv_ym = compute_invoice_ym(payload.purchase_date, int(card["closing_day"]))
-        cur = conn.execute(
+        row = _insert_returning(
+            conn,
+            "card_purchases",
             """
             INSERT INTO card_purchases(card_id, amount, description, category, purchase_date, invoice_ym, status, created_at)
             VALUES (?,?,?,?,?,?, 'pending', ?)
             """,
             (payload.card_id, float(payload.amount), payload.description, payload.category, payload.purchase_date, inv_ym, now_iso()),
         )
-        conn.commit()
-        _maybe_sync(conn)
-        new_id = _lastrowid(cur, conn)
-        row = q_one(conn, "SELECT * FROM card_purchases WHERE id=?", (new_id,))
         return row  # type: ignore[return-value]
 
 
@@ -1295,14 +1670,15 @@ def create_card_purchase(payload: CardPurchaseIn):
 def patch_card_purchase(purchase_id: int, payload: CardPurchasePatch):
     if payload.status not in ("pending", "paid"):
         raise HTTPException(status_code=422, detail="status inválido.")
+    # um UPDATE só: a existência da compra sai do rowcount (sem SELECT antes)
+    paid_at = now_iso() if payload.status == "paid" else None
     with db() as conn:
-        row = q_one(conn, "SELECT * FROM card_purchases WHERE id=?", (purchase_id,))
-        if not row:
+        cur = conn.execute(
+            "UPDATE card_purchases SET status=?, paid_at=? WHERE id=?",
+            (payload.status, paid_at, purchase_id),
+        )
+        if _rowcount(cur) == 0:
             raise HTTPException(status_code=404, detail="Compra não encontrada.")
-        if payload.status == "paid":
-            conn.execute("UPDATE card_purchases SET status='paid', paid_at=? WHERE id=?", (now_iso(), purchase_id))
-        else:
-            conn.execute("UPDATE card_purchases SET status='pending', paid_at=NULL WHERE id=?", (purchase_id,))
         conn.commit()
         _maybe_sync(conn)
         return {"ok": True}
@@ -1320,78 +1696,116 @@ def delete_card_purchase(purchase_id: int):
 
 
 @app.get("/cards/{card_id}/invoice-summary", response_model=InvoiceSummaryOut)
-def invoice_summary(card_id: int, invoice_ym: str):
-    parse_ym(invoice_ym)
+def invoice_summary(request: Request, card_id: int, invoice_ym: YearMonth):
     with db() as conn:
-        card = q_one(conn, "SELECT id FROM credit_cards WHERE id=?", (card_id,))
-        if not card:
-            raise HTTPException(status_code=404, detail="Cartão não encontrado.")
-        row = q_one(
-            conn,
+        return cached_response(
+            request, conn, ("invoice_summary", card_id, invoice_ym),
+            lambda: _invoice_summary_data(conn, card_id, invoice_ym),
+        )
+
+
+def _invoice_summary_data(conn: Any, card_id: int, invoice_ym: str) -> dict:
+    # existência do cartão na mesma consulta do agregado (sempre devolve 1 linha)
+    card_exists, cnt, total, pending_total, paid_total = conn.execute(
+        """
+        SELECT
+          (SELECT 1 FROM credit_cards WHERE id=?) AS card_exists,
+          COUNT(*) AS cnt,
+          TOTAL(amount) AS total,
+          TOTAL(CASE WHEN status='pending' THEN amount ELSE 0 END) AS pending_total,
+          TOTAL(CASE WHEN status='paid' THEN amount ELSE 0 END) AS paid_total
+        FROM card_purchases
+        WHERE card_id=? AND invoice_ym=?
+        """,
+        (card_id, card_id, invoice_ym),
+    ).fetchone()
+    if card_exists is None:
+        raise HTTPException(status_code=404, detail="Cartão não encontrado.")
+
+    return {
+        "card_id": card_id,
+        "invoice_ym": invoice_ym,
+        "total": total,
+        "pending_total": pending_total,
+        "paid_total": paid_total,
+        "count": cnt,
+    }
+
+
+PAY_INVOICES_MAX = 100
+
+_PAYMENT_INSERT_SQL = """
+INSERT INTO transactions(type, amount, description, date, account_id, category, created_at)
+VALUES ('expense', ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _settle_invoice(conn: Any, card_id: int, invoice_ym: str, ts: str) -> float:
+    """
+    Baixa as compras pendentes da fatura e devolve o total baixado (dentro da transação
+    já aberta). Fatura sem valor pendente fica intacta (savepoint desfeito).
+    """
+    params = (card_id, invoice_ym)
+    conn.execute("SAVEPOINT settle_invoice;")
+
+    if _HAS_RETURNING:
+        # baixa + soma numa instrução só: o UPDATE devolve o valor de cada compra baixada
+        paid = conn.execute(
             """
-            SELECT
-              COUNT(*) AS cnt,
-              SUM(amount) AS total,
-              SUM(CASE WHEN status='pending' THEN amount ELSE 0 END) AS pending_total,
-              SUM(CASE WHEN status='paid' THEN amount ELSE 0 END) AS paid_total
-            FROM card_purchases
-            WHERE card_id=? AND invoice_ym=?
+            UPDATE card_purchases
+            SET status='paid', paid_at=?
+            WHERE card_id=? AND invoice_ym=? AND status='pending'
+            RETURNING amount
             """,
-            (card_id, invoice_ym),
-        ) or {"cnt": 0, "total": 0.0, "pending_total": 0.0, "paid_total": 0.0}
+            (ts, *params),
+        ).fetchall()
+        total = float(sum(r[0] for r in paid))
+    else:
+        total = q_scalar(
+            conn,
+            "SELECT SUM(amount) AS total FROM card_purchases WHERE card_id=? AND invoice_ym=? AND status='pending'",
+            params,
+        )
+        if total > 0:
+            conn.execute(
+                """
+                UPDATE card_purchases
+                SET status='paid', paid_at=?
+                WHERE card_id=? AND invoice_ym=? AND status='pending'
+                """,
+                (ts, *params),
+            )
 
-        return {
-            "card_id": card_id,
-            "invoice_ym": invoice_ym,
-            "total": float(row.get("total") or 0.0),
-            "pending_total": float(row.get("pending_total") or 0.0),
-            "paid_total": float(row.get("paid_total") or 0.0),
-            "count": int(row.get("cnt") or 0),
-        }
+    if total <= 0:
+        conn.execute("ROLLBACK TO settle_invoice;")  # desfaz a baixa de compras zeradas
+    conn.execute("RELEASE settle_invoice;")
+    return total
 
 
 @app.post("/cards/pay-invoice")
 def pay_invoice(payload: PayInvoiceIn):
-    parse_ym(payload.invoice_ym)
     parse_date_yyyy_mm_dd(payload.pay_date)
     with db() as conn:
-        card = q_one(conn, "SELECT * FROM credit_cards WHERE id=?", (payload.card_id,))
+        card = q_one(conn, "SELECT name FROM credit_cards WHERE id=?", (payload.card_id,))
         if not card:
             raise HTTPException(status_code=400, detail="card_id inválido.")
         acc = q_one(conn, "SELECT id FROM accounts WHERE id=?", (payload.account_id,))
         if not acc:
             raise HTTPException(status_code=400, detail="account_id inválido.")
 
-        row = q_one(
-            conn,
-            """
-            SELECT SUM(amount) AS total
-            FROM card_purchases
-            WHERE card_id=? AND invoice_ym=? AND status='pending'
-            """,
-            (payload.card_id, payload.invoice_ym),
-        ) or {"total": 0.0}
-
-        total = float(row.get("total") or 0.0)
+        # soma do pendente, baixa e lançamento no caixa na mesma transação:
+        # nenhuma compra muda de status entre a soma e o UPDATE
+        _begin_write(conn)
+        ts = now_iso()  # mesmo instante na baixa das compras e no lançamento
+        total = _settle_invoice(conn, payload.card_id, payload.invoice_ym, ts)
         if total <= 0:
+            conn.rollback()
             return {"ok": True, "message": "Nada pendente para pagar nesta fatura.", "paid_total": 0.0}
 
-        conn.execute(
-            """
-            UPDATE card_purchases
-            SET status='paid', paid_at=?
-            WHERE card_id=? AND invoice_ym=? AND status='pending'
-            """,
-            (now_iso(), payload.card_id, payload.invoice_ym),
-        )
-
         desc = f"Pagamento fatura {card['name']} ({payload.invoice_ym})"
         conn.execute(
-            """
-            INSERT INTO transactions(type, amount, description, date, account_id, category, created_at)
-            VALUES ('expense', ?, ?, ?, ?, ?, ?)
-            """,
-            (total, desc, payload.pay_date, payload.account_id, CATEGORY_CARD_PAYMENT, now_iso()),
+            _PAYMENT_INSERT_SQL,
+            (total, desc, payload.pay_date, payload.account_id, CATEGORY_CARD_PAYMENT, ts),
         )
 
         conn.commit()
@@ -1399,23 +1813,75 @@ def pay_invoice(payload: PayInvoiceIn):
         return {"ok": True, "paid_total": total}
 
 
+@app.post("/cards/pay-invoices")
+def pay_invoices(payload: list[PayInvoiceIn]):
+    """
+    Várias faturas numa transação só: um BEGIN IMMEDIATE, as baixas com o mesmo
+    statement preparado, os lançamentos num executemany e um único commit/sync.
+    """
+    if not payload:
+        return {"ok": True, "paid_total": 0.0, "items": []}
+    if len(payload) > PAY_INVOICES_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo de {PAY_INVOICES_MAX} faturas por lote.")
+    for p in payload:
+        parse_date_yyyy_mm_dd(p.pay_date)
+
+    card_ids = sorted({p.card_id for p in payload})
+    acc_ids = sorted({p.account_id for p in payload})
+    with db() as conn:
+        names = dict(conn.execute(
+            f"SELECT id, name FROM credit_cards WHERE id IN ({','.join('?' * len(card_ids))})",
+            tuple(card_ids),
+        ).fetchall())
+        if len(names) != len(card_ids):
+            raise HTTPException(status_code=400, detail="card_id inválido.")
+        n_acc = conn.execute(
+            f"SELECT COUNT(*) FROM accounts WHERE id IN ({','.join('?' * len(acc_ids))})",
+            tuple(acc_ids),
+        ).fetchone()[0]
+        if n_acc != len(acc_ids):
+            raise HTTPException(status_code=400, detail="account_id inválido.")
+
+        _begin_write(conn)
+        ts = now_iso()
+        items: list[dict] = []
+        inserts: list[tuple] = []
+        for p in payload:
+            total = _settle_invoice(conn, p.card_id, p.invoice_ym, ts)
+            items.append({"card_id": p.card_id, "invoice_ym": p.invoice_ym, "paid_total": max(total, 0.0)})
+            if total > 0:
+                desc = f"Pagamento fatura {names[p.card_id]} ({p.invoice_ym})"
+                inserts.append((total, desc, p.pay_date, p.account_id, CATEGORY_CARD_PAYMENT, ts))
+
+        if not inserts:
+            conn.rollback()
+            return {"ok": True, "message": "Nada pendente para pagar nestas faturas.", "paid_total": 0.0, "items": items}
+
+        conn.executemany(_PAYMENT_INSERT_SQL, inserts)
+        conn.commit()
+        _maybe_sync(conn)
+        return {"ok": True, "paid_total": sum(i["paid_total"] for i in items), "items": items}
+
+
 # ============================================================
 # Reports
 # ============================================================
-def _fetch_monthly_report(conn: Any, ym: str) -> tuple[list[dict], list[dict]]:
-    tx = q_all(
+def _fetch_monthly_report(conn: Any, ym: str, fetch: Callable[..., Any] = q_all) -> tuple[Any, Any]:
+    tx = fetch(
         conn,
         """
-        SELECT * FROM transactions
-        WHERE substr(date,1,7)=?
+        SELECT id, type, amount, description, date, account_id, category, created_at
+        FROM transactions
+        WHERE date >= ? AND date < ?
         ORDER BY date ASC, id ASC
         """,
-        (ym,),
+        ym_bounds(ym),
     )
-    cp = q_all(
+    cp = fetch(
         conn,
         """
-        SELECT * FROM card_purchases
+        SELECT id, card_id, amount, description, category, purchase_date, invoice_ym, status, paid_at, created_at
+        FROM card_purchases
         WHERE invoice_ym=?
         ORDER BY purchase_date ASC, id ASC
         """,
@@ -1425,105 +1891,420 @@ def _fetch_monthly_report(conn: Any, ym: str) -> tuple[list[dict], list[dict]]:
 
 
 @app.get("/reports/monthly", response_model=MonthlyReportOut)
-def report_monthly(year: int, month: int):
-    if month < 1 or month > 12:
-        raise HTTPException(status_code=422, detail="month deve estar entre 1 e 12.")
+def report_monthly(year: int, month: Month, fmt: ReportLayout = "rows"):
+    """fmt=columnar: cada lista vira {"columns": [...], "data": [[coluna], ...]} (menos objetos por linha)."""
     ym = f"{year:04d}-{month:02d}"
     with db() as conn:
+        if fmt == "columnar":
+            tx, cp = _fetch_monthly_report(conn, ym, q_columns)
+            return _DefaultResponse({"year": year, "month": month, "ym": ym, "transactions": tx, "card_purchases": cp})
         tx, cp = _fetch_monthly_report(conn, ym)
         return {"year": year, "month": month, "ym": ym, "transactions": tx, "card_purchases": cp}
 
 
 @app.get("/reports/export")
-def report_export(year: int, month: int, fmt: ExportFormat = "csv"):
-    if month < 1 or month > 12:
-        raise HTTPException(status_code=422, detail="month deve estar entre 1 e 12.")
+def report_export(year: int, month: Month, fmt: ExportFormat = "csv"):
     ym = f"{year:04d}-{month:02d}"
-    with db() as conn:
-        tx, cp = _fetch_monthly_report(conn, ym)
-        if fmt == "json":
-            return {"year": year, "month": month, "ym": ym, "transactions": tx, "card_purchases": cp}
+    if fmt == "json":
+        with db() as conn:
+            tx, cp = _fetch_monthly_report(conn, ym)
+        return {"year": year, "month": month, "ym": ym, "transactions": tx, "card_purchases": cp}
 
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(
-            ["source", "ym", "date", "type", "amount", "description", "category", "account_id", "card_id", "invoice_ym", "status"]
-        )
+    filename = f"financeai_{ym}_export.csv"
+    return StreamingResponse(
+        _csv_chunks(
+            ["source", "ym", "date", "type", "amount", "description", "category", "account_id", "card_id", "invoice_ym", "status"],
+            _export_batches(ym),
+        ),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
-        for t in tx:
-            writer.writerow(
-                ["cash", ym, t.get("date"), t.get("type"), t.get("amount"), t.get("description"), t.get("category"), t.get("account_id"), "", "", ""]
-            )
-        for p in cp:
-            writer.writerow(
-                ["card", ym, p.get("purchase_date"), "card_purchase", p.get("amount"), p.get("description"), p.get("category"), "", p.get("card_id"), p.get("invoice_ym"), p.get("status")]
-            )
 
-        data_bytes = output.getvalue().encode("utf-8")
-        filename = f"financeai_{ym}_export.csv"
-        return StreamingResponse(
-            iter([data_bytes]),
-            media_type="text/csv; charset=utf-8",
-            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-        )
+EXPORT_BATCH_ROWS = 1000
+
+
+def _iter_batches(cur: Any, size: int = EXPORT_BATCH_ROWS):
+    """Lotes de fetchmany do cursor (sem fetchall; funciona no sqlite3 e no libSQL)."""
+    while True:
+        rows = cur.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def _export_batches(ym: str):
+    """
+    Lotes de linhas do CSV (tuplas já na ordem das colunas) lidos do cursor enquanto o corpo é enviado.
+    Usa conexão própria: o StreamingResponse consome o gerador depois que a rota retornou,
+    em outra thread do pool, então a conexão do db() (por thread) não pode ser usada aqui.
+    """
+    conn = get_conn()
+    try:
+        yield from _iter_batches(conn.execute(
+            """
+            SELECT 'cash', ?, date, type, amount, description, category, account_id, '', '', ''
+            FROM transactions
+            WHERE date >= ? AND date < ?
+            ORDER BY date ASC, id ASC
+            """,
+            (ym, *ym_bounds(ym)),
+        ))
+        yield from _iter_batches(conn.execute(
+            """
+            SELECT 'card', ?, purchase_date, 'card_purchase', amount, description, category, '', card_id, invoice_ym, status
+            FROM card_purchases
+            WHERE invoice_ym=?
+            ORDER BY purchase_date ASC, id ASC
+            """,
+            (ym, ym),
+        ))
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _csv_chunks(header: list[str], batches: Any):
+    """
+    CSV com um bloco de bytes por lote (writerows): o corpo vai sendo enviado enquanto é gerado,
+    sem montar o arquivo inteiro na memória e sem um send do ASGI por linha.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+
+    for rows in batches:
+        writer.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+
+    tail = buf.getvalue()
+    if tail:
+        yield tail.encode("utf-8")
 
 
 # ============================================================
 # AI (Groq)
 # ============================================================
-@app.post("/ai", response_model=AIResponse)
-def ask_ai(payload: AIRequest):
-    if not GROQ_API_KEY:
-        raise HTTPException(status_code=500, detail="GROQ_API_KEY não configurada no servidor.")
-    context_json = json.dumps(payload.context, ensure_ascii=False)
-    system_prompt = (
-        "Você é um consultor financeiro pessoal dentro do app FinanceAI. "
-        "Responda em Português do Brasil, objetivo, com Markdown, e cite números usando o contexto fornecido. "
-        "Se faltarem dados, diga explicitamente o que está faltando."
-    )
+AI_BATCH_MAX = 32
+AI_CONCURRENCY = 8
+
+# Cache exato das respostas: mesma pergunta + mesmo contexto (mesmo prompt) + mesmo modelo
+# reaproveita a resposta por AI_CACHE_TTL_S. Só é acessado no event loop (sem lock).
+_AI_CACHE: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+_AI_CACHE_MAX = 256
+
+
+def _ai_cache_get(key: str) -> Optional[str]:
+    hit = _AI_CACHE.get(key)
+    if hit is None:
+        return None
+    if hit[0] < time.monotonic():
+        del _AI_CACHE[key]
+        return None
+    _AI_CACHE.move_to_end(key)
+    return hit[1]
+
+
+def _ai_cache_put(key: str, answer: str) -> None:
+    _AI_CACHE[key] = (time.monotonic() + AI_CACHE_TTL_S, answer)
+    _AI_CACHE.move_to_end(key)
+    while len(_AI_CACHE) > _AI_CACHE_MAX:
+        _AI_CACHE.popitem(last=False)
+
+# cliente HTTP único do processo (keep-alive): aberto no lifespan e reaproveitado entre
+# chamadas, então o handshake TCP+TLS com a Groq sai do caminho quente
+_GROQ_CLIENT: Optional[httpx.AsyncClient] = None
+
+try:
+    import h2  # noqa: F401  # HTTP/2 opcional (pip install httpx[http2])
+
+    _GROQ_HTTP2 = True
+except Exception:
+    _GROQ_HTTP2 = False
+
+
+def _groq_client() -> httpx.AsyncClient:
+    global _GROQ_CLIENT
+    if _GROQ_CLIENT is None:
+        _GROQ_CLIENT = httpx.AsyncClient(
+            base_url=GROQ_BASE,
+            headers={
+                "Authorization": f"Bearer {GROQ_API_KEY}",
+                "User-Agent": "FinanceAI/1.7.1",
+            },
+            # pool keep-alive limitado; retries só refaz falhas de conexão (nunca um POST já enviado)
+            transport=httpx.AsyncHTTPTransport(
+                http2=_GROQ_HTTP2,
+                retries=2,
+                limits=httpx.Limits(max_connections=16, max_keepalive_connections=16),
+            ),
+            timeout=httpx.Timeout(60.0, connect=3.0),
+        )
+    return _GROQ_CLIENT
+
+
+async def close_groq_client() -> None:
+    global _GROQ_CLIENT
+    client, _GROQ_CLIENT = _GROQ_CLIENT, None
+    if client is not None:
+        await client.aclose()
+
+
+# Mensagem de sistema fixa: montada uma vez; por request só a mensagem do usuário muda
+_AI_SYSTEM_PROMPT = (
+    "Você é um consultor financeiro pessoal dentro do app FinanceAI. "
+    "Responda em Português do Brasil, objetivo, com Markdown, e cite números usando o contexto fornecido. "
+    "Se faltarem dados, diga explicitamente o que está faltando."
+)
+_AI_SYSTEM_MSG = {"role": "system", "content": _AI_SYSTEM_PROMPT}
+
+
+def _groq_request(payload: AIRequest) -> tuple[str, dict]:
+    """(chave do cache — vazia se desligado, corpo do chat/completions) da pergunta."""
+    context_json = json_dumps(payload.context).decode("utf-8")
     user_prompt = f"Contexto (JSON): {context_json}\n\nPergunta: {payload.question}"
+
+    cache_key = ""
+    if AI_CACHE_TTL_S > 0:
+        cache_key = hashlib.blake2b(f"{GROQ_MODEL}\0{user_prompt}".encode("utf-8"), digest_size=16).hexdigest()
+
     body = {
         "model": GROQ_MODEL,
         "messages": [
-            {"role": "system", "content": system_prompt},
+            _AI_SYSTEM_MSG,
             {"role": "user", "content": user_prompt},
         ],
         "temperature": 0.2,
     }
+    return cache_key, body
+
+
+async def _call_groq(payload: AIRequest) -> dict:
+    cache_key, body = _groq_request(payload)
+    cached = _ai_cache_get(cache_key) if cache_key else None
+    if cached is not None:
+        return {"answer_md": cached}
 
-    req = urllib.request.Request(
-        url=f"{GROQ_BASE}/chat/completions",
-        method="POST",
-        data=json.dumps(body).encode("utf-8"),
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "User-Agent": "FinanceAI/1.7.1",
-        },
-    )
     try:
-        with urllib.request.urlopen(req, timeout=60) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
-    except urllib.error.HTTPError as e:
-        err_body = ""
-        try:
-            err_body = e.read().decode("utf-8", errors="ignore")
-        except Exception:
-            err_body = str(e)
-        raise HTTPException(status_code=502, detail=f"Groq HTTPError {e.code}: {err_body}")
-    except urllib.error.URLError as e:
-        raise HTTPException(status_code=502, detail=f"Groq URLError: {e}")
+        resp = await _groq_client().post(
+            "/chat/completions",
+            content=json_dumps(body),
+            headers={"Content-Type": "application/json"},
+        )
+        resp.raise_for_status()
+        data = json_loads(resp.content)
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=502, detail=f"Groq HTTPError {e.response.status_code}: {e.response.text}")
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=502, detail=f"Groq RequestError: {e}")
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Falha ao chamar Groq: {e}")
 
-    answer = (data.get("choices") or [{}])[0].get("message", {}).get("content") or "Não consegui extrair a resposta do Groq."
+    answer = (data.get("choices") or [{}])[0].get("message", {}).get("content")
+    if not answer:
+        return {"answer_md": "Não consegui extrair a resposta do Groq."}
+    if cache_key:
+        _ai_cache_put(cache_key, answer)
     return {"answer_md": answer}
 
 
+@app.post("/ai", response_model=AIResponse)
+async def ask_ai(payload: AIRequest):
+    if not GROQ_API_KEY:
+        raise HTTPException(status_code=500, detail="GROQ_API_KEY não configurada no servidor.")
+    return await _call_groq(payload)
+
+
+def _sse(obj: Any) -> bytes:
+    return b"data: " + json_dumps(obj) + b"\n\n"
+
+
+_SSE_DONE = b"data: [DONE]\n\n"
+
+
+@app.post("/ai/stream")
+async def ask_ai_stream(payload: AIRequest):
+    """
+    Mesma pergunta do /ai, mas repassando os tokens da Groq conforme chegam (SSE):
+    eventos `data: {"delta": "..."}` e um `data: [DONE]` no fim.
+    """
+    if not GROQ_API_KEY:
+        raise HTTPException(status_code=500, detail="GROQ_API_KEY não configurada no servidor.")
+
+    headers = {"Cache-Control": "no-cache"}
+    cache_key, body = _groq_request(payload)
+    cached = _ai_cache_get(cache_key) if cache_key else None
+    if cached is not None:
+        return StreamingResponse(iter([_sse({"delta": cached}), _SSE_DONE]), media_type="text/event-stream", headers=headers)
+
+    client = _groq_client()
+    req = client.build_request(
+        "POST",
+        "/chat/completions",
+        content=json_dumps({**body, "stream": True}),
+        headers={"Content-Type": "application/json"},
+    )
+    # status da Groq conferido antes de abrir o stream: erro ainda vira HTTPException normal
+    try:
+        resp = await client.send(req, stream=True)
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=502, detail=f"Groq RequestError: {e}")
+    if resp.is_error:
+        err_body = (await resp.aread()).decode("utf-8", errors="ignore")
+        await resp.aclose()
+        raise HTTPException(status_code=502, detail=f"Groq HTTPError {resp.status_code}: {err_body}")
+
+    async def events():
+        parts: list[str] = []
+        complete = False
+        try:
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    complete = True
+                    break
+                try:
+                    chunk = json_loads(data)
+                except Exception:
+                    continue
+                delta = ((chunk.get("choices") or [{}])[0].get("delta") or {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    yield _sse({"delta": delta})
+        finally:
+            await resp.aclose()
+        if complete and parts and cache_key:
+            _ai_cache_put(cache_key, "".join(parts))
+        yield _SSE_DONE
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
+@app.post("/ai/batch", response_model=list[AIResponse])
+async def ask_ai_batch(payload: list[AIRequest]):
+    """
+    Várias perguntas numa requisição, disparadas em paralelo (no máximo AI_CONCURRENCY
+    simultâneas para respeitar o rate limit da Groq). A ordem da resposta segue a da entrada.
+    """
+    if not GROQ_API_KEY:
+        raise HTTPException(status_code=500, detail="GROQ_API_KEY não configurada no servidor.")
+    if not payload:
+        return []
+    if len(payload) > AI_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo de {AI_BATCH_MAX} perguntas por lote.")
+
+    sem = asyncio.Semaphore(AI_CONCURRENCY)
+
+    async def one(q: AIRequest) -> dict:
+        async with sem:
+            return await _call_groq(q)
+
+    return await asyncio.gather(*(one(q) for q in payload))
+
+
+# ------------------------------------------------------------
+# Jobs de AI (fila em memória): POST devolve 202 + id na hora e o cliente
+# consulta /ai/result/{id}; AI_CONCURRENCY workers consomem a fila no loop.
+# ------------------------------------------------------------
+AI_JOBS_MAX = 512
+# fila limitada: ativos (fila + AI_CONCURRENCY rodando) nunca passam de AI_JOBS_MAX,
+# então o histórico só precisa descartar jobs terminados
+AI_QUEUE_MAX = 256
+
+_AI_JOBS: "OrderedDict[str, dict]" = OrderedDict()
+_AI_QUEUE: Optional[asyncio.Queue] = None
+_AI_WORKERS: list[asyncio.Task] = []
+
+
+async def _ai_worker(queue: asyncio.Queue) -> None:
+    while True:
+        job_id, payload = await queue.get()
+        job = _AI_JOBS[job_id]
+        try:
+            job["status"] = "running"
+            res = await _call_groq(payload)
+            job.update(status="done", answer_md=res["answer_md"])
+        except HTTPException as e:
+            job.update(status="error", error=str(e.detail))
+        except Exception as e:
+            job.update(status="error", error=f"Falha ao chamar Groq: {e}")
+        finally:
+            queue.task_done()
+
+
+def start_ai_workers() -> None:
+    global _AI_QUEUE
+    _AI_QUEUE = asyncio.Queue(maxsize=AI_QUEUE_MAX)
+    _AI_WORKERS[:] = [asyncio.create_task(_ai_worker(_AI_QUEUE)) for _ in range(AI_CONCURRENCY)]
+
+
+async def stop_ai_workers() -> None:
+    global _AI_QUEUE
+    for t in _AI_WORKERS:
+        t.cancel()
+    await asyncio.gather(*_AI_WORKERS, return_exceptions=True)
+    _AI_WORKERS.clear()
+    _AI_QUEUE = None
+
+
+def _evict_finished_ai_jobs() -> None:
+    """Acima de AI_JOBS_MAX, descarta os jobs terminados (done/error) mais antigos."""
+    excess = len(_AI_JOBS) - AI_JOBS_MAX
+    if excess <= 0:
+        return
+    finished = [jid for jid, j in _AI_JOBS.items() if j["status"] in ("done", "error")]
+    for jid in finished[:excess]:
+        del _AI_JOBS[jid]
+
+
+@app.post("/ai/jobs", status_code=202, response_model=AIJobOut)
+async def create_ai_job(payload: AIRequest):
+    if not GROQ_API_KEY:
+        raise HTTPException(status_code=500, detail="GROQ_API_KEY não configurada no servidor.")
+    if _AI_QUEUE is None:
+        raise HTTPException(status_code=503, detail="Fila de AI indisponível.")
+
+    job_id = uuid.uuid4().hex
+    try:
+        _AI_QUEUE.put_nowait((job_id, payload))
+    except asyncio.QueueFull:
+        raise HTTPException(
+            status_code=503, detail="Fila de AI cheia. Tente novamente.", headers={"Retry-After": "5"}
+        )
+
+    # sem await entre o put e o registro: o worker só pega o job depois deste return
+    job = {"id": job_id, "status": "queued", "answer_md": None, "error": None}
+    _AI_JOBS[job_id] = job
+    _evict_finished_ai_jobs()
+    return job
+
+
+@app.get("/ai/result/{job_id}", response_model=AIJobOut)
+async def get_ai_job(job_id: str):
+    job = _AI_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job de AI não encontrado.")
+    return job
+
+
 # ============================================================
 # Forecast — diário (caixa)
 # ============================================================
-def _fetch_daily_income_expense(conn: Any, account_id: Optional[int], exclude_card_payments: bool) -> list[dict]:
+def _fetch_daily_income_expense(conn: Any, account_id: Optional[int], exclude_card_payments: bool) -> DailySeries:
+    return cached_value(
+        conn, ("daily_income_expense", account_id, exclude_card_payments),
+        lambda: _query_daily_income_expense(conn, account_id, exclude_card_payments),
+    )
+
+
+def _query_daily_income_expense(conn: Any, account_id: Optional[int], exclude_card_payments: bool) -> DailySeries:
+    # série diária já em colunas (date/income/expense): sem dict por dia até o treino
     where_extra = ""
     params: list[Any] = []
 
@@ -1532,38 +2313,31 @@ def _fetch_daily_income_expense(conn: Any, account_id: Optional[int], exclude_ca
         params.append(CATEGORY_CARD_PAYMENT)
 
     if account_id is None:
-        return q_all(
-            conn,
-            f"""
-            SELECT date,
-                   SUM(CASE WHEN type='income' THEN amount ELSE 0 END) AS income,
-                   SUM(CASE WHEN type='expense' THEN amount ELSE 0 END) AS expense
-            FROM transactions
-            WHERE 1=1 {where_extra}
-            GROUP BY date
-            ORDER BY date ASC
-            """,
-            tuple(params),
-        )
+        where = f"WHERE 1=1 {where_extra}"
+    else:
+        where = f"WHERE account_id=? {where_extra}"
+        params.insert(0, account_id)
 
-    params = [account_id] + params
-    return q_all(
-        conn,
+    rows = conn.execute(
         f"""
         SELECT date,
                SUM(CASE WHEN type='income' THEN amount ELSE 0 END) AS income,
                SUM(CASE WHEN type='expense' THEN amount ELSE 0 END) AS expense
         FROM transactions
-        WHERE account_id=? {where_extra}
+        {where}
         GROUP BY date
         ORDER BY date ASC
         """,
         tuple(params),
-    )
+    ).fetchall()
+    if not rows:
+        return fill_daily_columns([], [], [])
+    dates, income, expense = zip(*rows)
+    return fill_daily_columns(dates, income, expense)
 
 
 @app.post("/forecast/daily/train")
-def forecast_daily_train(account_id: Optional[int] = None, lags: int = 14, exclude_card_payments: bool = True):
+def forecast_daily_train(account_id: Optional[int] = None, lags: ForecastLags = 14, exclude_card_payments: bool = True):
     with db() as conn:
         rows = _fetch_daily_income_expense(conn, account_id=account_id, exclude_card_payments=exclude_card_payments)
         try:
@@ -1586,14 +2360,24 @@ def forecast_daily_train(account_id: Optional[int] = None, lags: int = 14, exclu
 
 @app.get("/forecast/daily", response_model=ForecastDailyOut)
 def forecast_daily(
-    days: int = 7,
+    request: Request,
+    response: Response,
+    days: ForecastDays = 7,
     auto_train: bool = True,
-    lags: int = 14,
+    lags: ForecastLags = 14,
     account_id: Optional[int] = None,
     exclude_card_payments: bool = True,
 ):
     with db() as conn:
         name = f"forecast_daily_v2_acc_{account_id if account_id is not None else 'all'}_xpay_{1 if exclude_card_payments else 0}"
+        # sem anchor_date a previsão diária depende do dia local: entra no ETag
+        today = datetime.now().strftime("%Y-%m-%d")
+        trained_at = model_trained_at(conn, name)
+        if trained_at is not None:
+            not_modified = forecast_not_modified(request, forecast_etag(name, trained_at, int(days), today))
+            if not_modified is not None:
+                return not_modified
+
         payload = load_model(conn, name)
 
         if not payload:
@@ -1647,6 +2431,7 @@ def forecast_daily(
                 "O Groq deve ser usado para explicar, não para prever números."
             )
 
+        set_forecast_etag(response, forecast_etag(name, payload.get("trained_at") or "", int(days), today))
         return {
             "ok": True,
             "basis": payload.get("basis", "cash_daily_sklearn"),
@@ -1664,21 +2449,69 @@ def forecast_daily(
 # Forecast — competência mensal
 # ============================================================
 def _fetch_monthly_competencia(conn: Any, account_id: Optional[int], include_card: bool) -> list[dict]:
-    if account_id is None:
-        r1 = q_one(conn, "SELECT MIN(substr(date,1,7)) AS mn, MAX(substr(date,1,7)) AS mx FROM transactions")
-    else:
-        r1 = q_one(conn, "SELECT MIN(substr(date,1,7)) AS mn, MAX(substr(date,1,7)) AS mx FROM transactions WHERE account_id=?", (account_id,))
+    return cached_value(
+        conn, ("monthly_competencia", account_id, include_card),
+        lambda: _query_monthly_competencia(conn, account_id, include_card),
+    )
 
-    r2 = None
+
+def _count_monthly_competencia(conn: Any, account_id: Optional[int], include_card: bool) -> int:
+    """
+    len() da série de _fetch_monthly_competencia sem montá-la: a série cobre todo mês
+    entre o primeiro e o último lançamento, então bastam MIN/MAX (busca no índice).
+    """
+    acc_filter = "" if account_id is None else " WHERE account_id=?"
+    params: tuple = () if account_id is None else (account_id,)
+    bounds = [
+        ym
+        for ym in conn.execute(
+            f"SELECT substr(MIN(date),1,7), substr(MAX(date),1,7) FROM transactions{acc_filter}", params
+        ).fetchone()
+        if ym
+    ]
     if include_card:
-        r2 = q_one(conn, "SELECT MIN(invoice_ym) AS mn, MAX(invoice_ym) AS mx FROM card_purchases")
+        bounds += [
+            ym
+            for ym in conn.execute("SELECT MIN(invoice_ym), MAX(invoice_ym) FROM card_purchases").fetchone()
+            if ym
+        ]
+    if not bounds:
+        return 0
+
+    start_ym, end_ym = min(bounds), max(bounds)
+    return (int(end_ym[:4]) - int(start_ym[:4])) * 12 + int(end_ym[5:7]) - int(start_ym[5:7]) + 1
 
-    mins = [x for x in [(r1 or {}).get("mn"), (r2 or {}).get("mn") if r2 else None] if x]
-    maxs = [x for x in [(r1 or {}).get("mx"), (r2 or {}).get("mx") if r2 else None] if x]
-    if not mins or not maxs:
+
+def _query_monthly_competencia(conn: Any, account_id: Optional[int], include_card: bool) -> list[dict]:
+    # uma consulta agrupada por mês para o caixa (+ uma para o cartão) em vez de 2-3 por mês;
+    # o intervalo de meses sai das próprias chaves (todo mês com lançamento vira um grupo)
+    acc_filter = "" if account_id is None else " WHERE account_id=?"
+    params: tuple = (CATEGORY_CARD_PAYMENT,) if account_id is None else (CATEGORY_CARD_PAYMENT, account_id)
+    cash = {
+        ym: (inc, exp)
+        for ym, inc, exp in conn.execute(
+            f"""
+            SELECT substr(date,1,7) AS ym,
+                   TOTAL(CASE WHEN type='income' THEN amount END) AS income,
+                   TOTAL(CASE WHEN type='expense' AND category<>? THEN amount END) AS expense_cash_real
+            FROM transactions{acc_filter}
+            GROUP BY 1
+            """,
+            params,
+        ).fetchall()
+    }
+
+    card: dict[str, float] = {}
+    if include_card:
+        card = dict(conn.execute(
+            "SELECT invoice_ym, TOTAL(amount) AS s FROM card_purchases GROUP BY invoice_ym"
+        ).fetchall())
+
+    keys = [*cash, *card]
+    if not keys:
         return []
 
-    start_ym, end_ym = min(mins), max(maxs)
+    start_ym, end_ym = min(keys), max(keys)
 
     def month_seq_local(start_ym: str, end_ym: str):
         sy, sm = start_ym.split("-")
@@ -1694,61 +2527,17 @@ def _fetch_monthly_competencia(conn: Any, account_id: Optional[int], include_car
                 y += 1
         return out
 
-    yms = month_seq_local(start_ym, end_ym)
     series = []
-
-    for ym in yms:
-        if account_id is None:
-            income = q_scalar(conn, "SELECT SUM(amount) AS s FROM transactions WHERE substr(date,1,7)=? AND type='income'", (ym,), default=0.0)
-            expense_cash_real = q_scalar(
-                conn,
-                """
-                SELECT SUM(amount) AS s
-                FROM transactions
-                WHERE substr(date,1,7)=?
-                  AND type='expense'
-                  AND category<>?
-                """,
-                (ym, CATEGORY_CARD_PAYMENT),
-                default=0.0,
-            )
-        else:
-            income = q_scalar(
-                conn,
-                """
-                SELECT SUM(amount) AS s
-                FROM transactions
-                WHERE substr(date,1,7)=? AND type='income' AND account_id=?
-                """,
-                (ym, account_id),
-                default=0.0,
-            )
-            expense_cash_real = q_scalar(
-                conn,
-                """
-                SELECT SUM(amount) AS s
-                FROM transactions
-                WHERE substr(date,1,7)=?
-                  AND type='expense'
-                  AND category<>?
-                  AND account_id=?
-                """,
-                (ym, CATEGORY_CARD_PAYMENT, account_id),
-                default=0.0,
-            )
-
-        expense_card = 0.0
-        if include_card:
-            expense_card = q_scalar(conn, "SELECT SUM(amount) AS s FROM card_purchases WHERE invoice_ym=?", (ym,), default=0.0)
-
-        expense_total = float(expense_cash_real) + float(expense_card)
-        series.append({"ym": ym, "income": float(income), "expense_total": float(expense_total)})
+    for ym in month_seq_local(start_ym, end_ym):
+        income, expense_cash_real = cash.get(ym, (0.0, 0.0))
+        expense_total = expense_cash_real + card.get(ym, 0.0)
+        series.append({"ym": ym, "income": income, "expense_total": expense_total})
 
     return series
 
 
 @app.post("/forecast/train", response_model=ForecastTrainOut)
-def forecast_train(lags: int = 6, account_id: Optional[int] = None, include_card: bool = True):
+def forecast_train(lags: ForecastLags = 6, account_id: Optional[int] = None, include_card: bool = True):
     with db() as conn:
         series = _fetch_monthly_competencia(conn, account_id=account_id, include_card=include_card)
         try:
@@ -1791,12 +2580,16 @@ def forecast_train(lags: int = 6, account_id: Optional[int] = None, include_card
 
 
 @app.get("/forecast/status")
-def forecast_status(account_id: Optional[int] = None, include_card: bool = True, min_months: int = 12, lags: int = 6):
+def forecast_status(
+    account_id: Optional[int] = None,
+    include_card: bool = True,
+    min_months: MinMonths = 12,
+    lags: ForecastLags = 6,
+):
     with db() as conn:
         name = f"forecast_comp_v2_acc_{account_id if account_id is not None else 'all'}_card_{1 if include_card else 0}"
         payload = load_model(conn, name)
-        series = _fetch_monthly_competencia(conn, account_id=account_id, include_card=include_card)
-        n_months = len(series)
+        n_months = _count_monthly_competencia(conn, account_id=account_id, include_card=include_card)
 
         required = int(lags) + 6
         can_train = (n_months >= required) and (n_months >= int(min_months))
@@ -1812,9 +2605,23 @@ def forecast_status(account_id: Optional[int] = None, include_card: bool = True,
 
 
 @app.get("/forecast", response_model=ForecastOut)
-def forecast_get(horizon: int = 12, auto_train: bool = True, lags: int = 6, account_id: Optional[int] = None, include_card: bool = True):
+def forecast_get(
+    request: Request,
+    response: Response,
+    horizon: ForecastHorizon = 12,
+    auto_train: bool = True,
+    lags: ForecastLags = 6,
+    account_id: Optional[int] = None,
+    include_card: bool = True,
+):
     with db() as conn:
         name = f"forecast_comp_v2_acc_{account_id if account_id is not None else 'all'}_card_{1 if include_card else 0}"
+        trained_at = model_trained_at(conn, name)
+        if trained_at is not None:
+            not_modified = forecast_not_modified(request, forecast_etag(name, trained_at, int(horizon)))
+            if not_modified is not None:
+                return not_modified
+
         payload = load_model(conn, name)
 
         if not payload:
@@ -1862,6 +2669,7 @@ def forecast_get(horizon: int = 12, auto_train: bool = True, lags: int = 6, acco
             "Pagamento de fatura afeta caixa, mas não é despesa real e não entra na despesa projetada."
         )
 
+        set_forecast_etag(response, forecast_etag(name, payload.get("trained_at") or "", int(horizon)))
         return {
             "ok": True,
             "basis": payload.get("basis", "competencia_sklearn"),
@@ -1878,9 +2686,7 @@ def forecast_get(horizon: int = 12, auto_train: bool = True, lags: int = 6, acco
 # (Opcional) utilitário: listar modelos salvos
 # ============================================================
 @app.get("/ml/models")
-def list_ml_models(limit: int = 50):
-    if limit < 1 or limit > 500:
-        raise HTTPException(status_code=422, detail="limit deve estar entre 1 e 500.")
+def list_ml_models(limit: Annotated[int, Query(ge=1, le=500)] = 50):
     with db() as conn:
         return q_all(conn, "SELECT name, trained_at FROM ml_models ORDER BY trained_at DESC LIMIT ?", (limit,))
 
@@ -0,0 +1,75 @@
+import importlib
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture()
+def client(tmp_path, monkeypatch):
+    # DB_PATH é lido na importação: banco novo por teste
+    monkeypatch.setenv("FINANCE_DB", str(tmp_path / "finance.db"))
+    monkeypatch.delenv("TURSO_DATABASE_URL", raising=False)
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    sys.modules.pop("server", None)
+    server = importlib.import_module("server")
+
+    from fastapi.testclient import TestClient
+
+    with TestClient(server.app, raise_server_exceptions=False) as c:
+        yield c
+    server.close_pool()
+    sys.modules.pop("server", None)
+
+
+def _seed_transactions(client, days: int = 540) -> None:
+    account_id = client.get("/accounts").json()[0]["id"]
+    start = date.today() - timedelta(days=days)
+    for i in range(0, days, 3):
+        d = (start + timedelta(days=i)).isoformat()
+        kind = "income" if i % 2 else "expense"
+        r = client.post(
+            "/transactions",
+            json={
+                "type": kind,
+                "amount": 100 + (i % 17) * 10,
+                "description": "teste",
+                "date": d,
+                "account_id": account_id,
+                "category": "Salário" if kind == "income" else "Mercado",
+            },
+        )
+        assert r.status_code == 200, r.text
+
+
+def test_forecast_train_routes(client):
+    _seed_transactions(client)
+
+    r = client.post("/forecast/train", params={"lags": 3})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["ok"] is True
+    assert body["trained_at"]
+    assert "etag" not in r.headers
+
+    r = client.post("/forecast/daily/train", params={"lags": 7})
+    assert r.status_code == 200, r.text
+    assert r.json()["ok"] is True
+
+
+def test_forecast_get_etag_304(client):
+    _seed_transactions(client)
+    assert client.post("/forecast/train", params={"lags": 3}).status_code == 200
+
+    r = client.get("/forecast", params={"horizon": 6})
+    assert r.status_code == 200, r.text
+    etag = r.headers["etag"]
+
+    r2 = client.get("/forecast", params={"horizon": 6}, headers={"If-None-Match": etag})
+    assert r2.status_code == 304
+    assert r2.content == b""